@@ -1,28 +1,75 @@
 # agents/concept_explainer.py
 from langchain_groq import ChatGroq
 from langchain_core.messages import SystemMessage, HumanMessage
-from config.settings import GROQ_API_KEY, GROQ_MODEL
-from utils.vector_store import search_vector_store
+from config.settings import GROQ_API_KEY, GROQ_MODEL, NEIGHBOUR_WINDOW, SEMANTIC_CACHE_ENABLED
+from utils.vector_store import get_vector_store, search_vector_store, scope_key, skips_query_embedding
+from utils.semantic_cache import semantic_answer_cache
+from utils.llm_cache import CachedLLM
 
 class ConceptExplainerAgent:
-    def __init__(self, vector_store=None):
-        """Initialize the concept explainer agent with Groq LLM"""
-        self.llm = ChatGroq(
+    def __init__(self, vector_store=None, scope=None, db_path=None):
+        """
+        Initialize the concept explainer agent with Groq LLM
+
+        Args:
+            vector_store: Index of study materials
+            scope: Default search scope, e.g. {"course": "STAT101"} (see search_vector_store)
+            db_path: Index directory to use instead of vector_store; its published snapshot is
+                     looked up in the shared registry on each call, so the agent keeps nothing loaded
+        """
+        self.llm = CachedLLM(ChatGroq(
             model=GROQ_MODEL,
             temperature=0.7,
             groq_api_key=GROQ_API_KEY
-        )
+        ), "concept_explainer")
         self.vector_store = vector_store
+        self.db_path = db_path
+        self.scope = scope
         self.chat_history = []
+
+    @property
+    def vector_store(self):
+        if self.db_path is not None:
+            return get_vector_store(self.db_path)
+        return self._vector_store
+
+    @vector_store.setter
+    def vector_store(self, vector_store):
+        self._vector_store = vector_store
         
-    def explain_concept(self, question):
-        """Explain a concept using RAG (Retrieval Augmented Generation)"""
-        if not self.vector_store:
-            return "❌ No study materials loaded. Please upload documents first."
+    def _prepare(self, vector_store, question, scope):
+        """
+        Retrieve context and build the prompt for a question
+
+        Returns:
+            dict: {"answer"} when a cached answer can be reused, otherwise
+                  {"messages", "results", "partition", "question_vector"}
+        """
+        # Step 0: A reworded version of an earlier question over the same material and course
+        # (not for keyword queries, which are answered from BM25 without embedding them)
+        partition = question_vector = None
+        if SEMANTIC_CACHE_ENABLED and not skips_query_embedding(question):
+            partition = (getattr(vector_store, "db_path", id(vector_store)),
+                         getattr(vector_store, "index_version", None), scope_key(scope))
+            # Embedded once: search_vector_store gets it from the query embedding cache
+            question_vector = vector_store.embedding_function.embed_query(question)
+            cached = semantic_answer_cache.lookup(partition, question_vector)
+            if cached:
+                answer, cached_question, similarity = cached
+                print(f"💾 Reusing the answer to \"{cached_question}\" (similarity {similarity:.2f})")
+                self.chat_history.append({
+                    'question': question,
+                    'answer': answer,
+                    'context_used': 0,
+                    'cached': True
+                })
+                return {"answer": answer}
         
         # Step 1: Retrieve relevant context from vector store
         print(f"🔍 Searching for relevant information...")
-        results = search_vector_store(self.vector_store, question, k=3)
+        # Two hits widened with their neighbouring chunks give the same context as k=3 in fewer tokens
+        results = search_vector_store(vector_store, question, k=2, neighbours=NEIGHBOUR_WINDOW,
+                                      scope=scope)
         context = "\n\n".join([doc.page_content for doc in results])
         
         # Step 2: Create prompt with context
@@ -41,23 +88,59 @@ Instructions:
 
 Answer:"""
         
-        # Step 3: Get response from Groq
         messages = [
             SystemMessage(content="You are a helpful study assistant that explains concepts clearly and accurately based on provided study materials."),
             HumanMessage(content=prompt)
         ]
-        
-        print(f"🤖 Generating answer with Groq...")
-        response = self.llm.invoke(messages)
-        
-        # Store in chat history
+        return {"messages": messages, "results": results, "partition": partition,
+                "question_vector": question_vector}
+
+    def _record(self, question, answer, prepared):
+        """Store a generated answer in chat history and the semantic cache"""
         self.chat_history.append({
             'question': question,
-            'answer': response.content,
-            'context_used': len(results)
+            'answer': answer,
+            'context_used': len(prepared["results"])
         })
+        if prepared["question_vector"] is not None and prepared["results"]:
+            semantic_answer_cache.add(prepared["partition"], prepared["question_vector"], question, answer)
+
+    def explain_concept(self, question, scope=None):
+        """Explain a concept using RAG (Retrieval Augmented Generation), searching scope (default self.scope)"""
+        vector_store = self.vector_store
+        if not vector_store:
+            return "❌ No study materials loaded. Please upload documents first."
+        prepared = self._prepare(vector_store, question, scope or self.scope)
+        if "answer" in prepared:
+            return prepared["answer"]
         
+        # Step 3: Get response from Groq
+        print("🤖 Generating answer with Groq...")
+        response = self.llm.invoke(prepared["messages"])
+        self._record(question, response.content, prepared)
         return response.content
+
+    def explain_concept_stream(self, question, scope=None):
+        """
+        Same as explain_concept, but yield the answer text as the tokens arrive
+
+        The answer is added to chat history (and the caches) once the stream completes.
+        """
+        vector_store = self.vector_store
+        if not vector_store:
+            yield "❌ No study materials loaded. Please upload documents first."
+            return
+        prepared = self._prepare(vector_store, question, scope or self.scope)
+        if "answer" in prepared:
+            yield prepared["answer"]
+            return
+
+        print("🤖 Streaming answer from Groq...")
+        parts = []
+        for chunk in self.llm.stream(prepared["messages"]):
+            parts.append(chunk.content)
+            yield chunk.content
+        self._record(question, "".join(parts), prepared)
     
     def get_chat_history(self):
         """Return chat history"""
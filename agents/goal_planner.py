@@ -4,15 +4,17 @@ from langchain_core.messages import SystemMessage, HumanMessage
 from config.settings import GROQ_API_KEY, GROQ_MODEL
 import json
 from datetime import datetime, timedelta
+from utils.llm_cache import CachedLLM
+from utils.json_stream import JsonArrayStream
 
 class GoalPlannerAgent:
     def __init__(self):
         """Initialize the goal planner agent with Groq LLM"""
-        self.llm = ChatGroq(
+        self.llm = CachedLLM(ChatGroq(
             model=GROQ_MODEL,
             temperature=0.3,  # Lower temperature for more structured output
             groq_api_key=GROQ_API_KEY
-        )
+        ), "goal_planner")
     
     def create_study_plan(self, goal, deadline, daily_hours, current_knowledge="beginner"):
         """
@@ -27,7 +29,34 @@ class GoalPlannerAgent:
         Returns:
             dict: Structured study plan with subtasks, schedule, and milestones
         """
-        
+        messages = self._plan_messages(goal, deadline, daily_hours, current_knowledge)
+        if isinstance(messages, dict):
+            return messages
+        response = self.llm.invoke(messages)
+        return self._parse_plan(response.content, messages)
+
+    def create_study_plan_stream(self, goal, deadline, daily_hours, current_knowledge="beginner"):
+        """
+        Same as create_study_plan, but report progress while the plan is generated
+
+        Yields:
+            tuple: ("subtask", dict) for each subtask as soon as it is complete,
+                   then ("plan", dict) with the full plan (or the error dict)
+        """
+        messages = self._plan_messages(goal, deadline, daily_hours, current_knowledge)
+        if isinstance(messages, dict):
+            yield "plan", messages
+            return
+        subtasks = JsonArrayStream("subtasks")
+        parts = []
+        for chunk in self.llm.stream(messages):
+            parts.append(chunk.content)
+            for subtask in subtasks.feed(chunk.content):
+                yield "subtask", subtask
+        yield "plan", self._parse_plan("".join(parts), messages)
+
+    def _plan_messages(self, goal, deadline, daily_hours, current_knowledge):
+        """Prompt for a study plan (or an error dict if the deadline has passed)"""
         # Calculate days available
         deadline_date = datetime.strptime(deadline, "%Y-%m-%d")
         today = datetime.now()
@@ -96,13 +125,13 @@ Make the plan realistic, achievable, and well-structured. Include specific actio
         
         print(f"🎯 Creating study plan for: {goal}")
         print(f"⏰ Available: {days_available} days, {total_hours} total hours\n")
-        
-        response = self.llm.invoke(messages)
-        
-        # Parse JSON response
+        return messages
+
+    def _parse_plan(self, response_content, messages):
+        """Plan dict from the LLM response (error dict if it is not valid JSON)"""
         try:
             # Extract JSON from response (sometimes LLMs add extra text)
-            content = response.content.strip()
+            content = response_content.strip()
             
             # Find JSON block
             if "```json" in content:
@@ -118,11 +147,12 @@ Make the plan realistic, achievable, and well-structured. Include specific actio
             return plan
             
         except json.JSONDecodeError as e:
+            self.llm.forget(messages)
             print(f"❌ Error parsing plan: {e}")
-            print(f"Response: {response.content[:500]}")
+            print(f"Response: {response_content[:500]}")
             return {
                 "error": "Failed to generate plan",
-                "raw_response": response.content
+                "raw_response": response_content
             }
     
     def adapt_plan(self, current_plan, performance_data):
@@ -171,6 +201,7 @@ Make the plan realistic, achievable, and well-structured. Include specific actio
             adaptations['adapted_at'] = datetime.now().isoformat()
             return adaptations
         except Exception:
+            self.llm.forget(messages)
             return {
                 "recommendations": [response.content.strip()],
                 "adapted_at": datetime.now().isoformat()
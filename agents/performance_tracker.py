@@ -32,7 +32,7 @@ class PerformanceTracker:
             json.dump(self.performance_data, f, indent=2)
         print(f"💾 Performance data saved to {self.data_file}")
     
-    def record_quiz_score(self, topic, score, max_score=100):
+    def record_quiz_score(self, topic, score, max_score=100, difficulty=None):
         """
         Record a quiz score
         
@@ -40,6 +40,7 @@ class PerformanceTracker:
             topic: Quiz topic/subject
             score: Points scored
             max_score: Maximum possible points
+            difficulty: easy/medium/hard, if the score is for a generated quiz
         """
         percentage = (score / max_score) * 100
         
@@ -47,6 +48,7 @@ class PerformanceTracker:
             "topic": topic,
             "score": score,
             "max_score": max_score,
+            "difficulty": difficulty,
             "percentage": round(percentage, 2),
             "date": datetime.now().isoformat(),
             "status": "pass" if percentage >= 70 else "needs_improvement"
@@ -119,6 +121,29 @@ class PerformanceTracker:
         """Get list of topics needing improvement"""
         return self.performance_data["weak_topics"]
     
+    def get_recent_topics(self, limit=3):
+        """Most recently quizzed topics, newest first"""
+        topics = []
+        for quiz in reversed(self.performance_data["quiz_scores"]):
+            if quiz["topic"] not in topics:
+                topics.append(quiz["topic"])
+            if len(topics) == limit:
+                break
+        return topics
+    
+    def get_usual_quiz_settings(self, recent=10):
+        """Most common difficulty and length of the user's recent quizzes"""
+        quizzes = [q for q in self.performance_data["quiz_scores"] if q.get("difficulty")][-recent:]
+        if not quizzes:
+            return {"difficulty": "medium", "num_questions": 5}
+        difficulties = [q["difficulty"] for q in quizzes]
+        lengths = [q["max_score"] for q in quizzes]
+        return {
+            # Ties go to the most recent choice
+            "difficulty": max(reversed(difficulties), key=difficulties.count),
+            "num_questions": max(reversed(lengths), key=lengths.count)
+        }
+    
     def get_completion_rate(self, total_tasks):
         """Calculate task completion rate"""
         completed = len(self.performance_data["completed_tasks"])
@@ -4,13 +4,16 @@ from agents.goal_planner import GoalPlannerAgent
 from agents.concept_explainer import ConceptExplainerAgent
 from agents.performance_tracker import PerformanceTracker
 from tools.quiz_generator import QuizGenerator
-from utils.document_processor import chunk_text
-from utils.pdf_processor import chunk_pdf_text
-from utils.vector_store import create_vector_store
+from tools.quiz_prefetcher import get_quiz_prefetcher
+from config.settings import USER_DATA_PATH
+from utils.vector_store import load_manifest, delete_document, current_version
+from utils.index_registry import namespace_key, namespace_path, list_namespaces, open_namespace
+from utils.ingestion import get_ingestion_queue, job_progress
 from utils.pdf_export import export_plan_to_pdf
 from utils.reminder_manager import ReminderManager
 from utils.auth import UserAuth
 from utils.todo_manager import TodoManager
+from utils.embeddings import warm_embeddings_async
 import os
 import re
 import os 
@@ -108,12 +111,16 @@ if not st.session_state.logged_in:
             if success:
                 st.session_state.logged_in = True
                 st.session_state.username = login_username
+                # Start from this user's own default index (recomputed after the rerun)
+                st.session_state.pop("namespace", None)
                 st.session_state.performance_tracker = PerformanceTracker(user_id=login_username)
                 st.session_state.todo_manager = TodoManager(user_id=login_username)
                 st.session_state.reminder_manager = ReminderManager()
                 # LOAD PERSISTED REMINDERS HERE!
                 st.session_state.scheduled_reminders = st.session_state.reminder_manager.load_scheduled_reminders(login_username)
                 st.session_state.reminder_manager.schedule_reminders_from_file(login_username)
+                # Load the embedding model while the user looks around
+                warm_embeddings_async()
                 st.success(f"✅ Welcome back, {login_username}!")
                 st.rerun()
             else:
@@ -152,8 +159,6 @@ if "concept_agent" not in st.session_state:
     st.session_state.concept_agent = None
 if "quiz_generator" not in st.session_state:
     st.session_state.quiz_generator = None
-if "vector_store" not in st.session_state:
-    st.session_state.vector_store = None
 if "reminder_manager" not in st.session_state:
     st.session_state.reminder_manager = ReminderManager()
 if "current_plan" not in st.session_state:
@@ -163,6 +168,67 @@ if "current_quiz" not in st.session_state:
 if "quiz_answers" not in st.session_state:
     st.session_state.quiz_answers = {}
 
+
+def scope_picker(key, vector_store):
+    """Let the user limit retrieval to one course or their own uploads; returns a search scope"""
+    files = vector_store.files.values()
+    courses = sorted({entry["course"] for entry in files if entry.get("course")})
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        course = st.selectbox("📘 Course", ["All courses"] + courses, key=f"{key}_course")
+    with col2:
+        mine = st.checkbox("Only my uploads", key=f"{key}_mine")
+    scope = {}
+    if course != "All courses":
+        scope["course"] = course
+    if mine:
+        scope["owner"] = st.session_state.username
+    return scope or None
+
+
+def default_namespace():
+    """The user's first course index, else the shared index"""
+    mine = list_namespaces(st.session_state.username)
+    return (st.session_state.username, mine[0]["course"]) if mine else (None, None)
+
+
+if "namespace" not in st.session_state:
+    st.session_state.namespace = default_namespace()
+
+
+def use_latest_index():
+    """
+    Newest published snapshot of the session's namespace, for this run (None if nothing is indexed)
+
+    The session keeps only the namespace key: the agents look the index up in the
+    registry on each call, so an idle session holds no index and one the registry
+    closes is actually freed.
+    """
+    db_path = namespace_path(*st.session_state.namespace)
+    if st.session_state.concept_agent is None:
+        st.session_state.concept_agent = ConceptExplainerAgent(db_path=db_path)
+    else:
+        st.session_state.concept_agent.db_path = db_path
+    if st.session_state.quiz_generator is None:
+        st.session_state.quiz_generator = QuizGenerator(db_path=db_path)
+    else:
+        st.session_state.quiz_generator.db_path = db_path
+    return open_namespace(*st.session_state.namespace)
+
+
+def start_quiz(quiz, scope=None):
+    """Show quiz as the current quiz (scope is kept for prefetching the next one)"""
+    st.session_state.current_quiz = quiz
+    st.session_state.quiz_scope = scope
+    st.session_state.quiz_answers = {}
+    st.session_state.quiz_submitted = False
+    st.session_state.quiz_result_saved = False
+
+
+# Re-ingestion publishes a new snapshot; Q&A keeps running on the old one until then.
+# The store is re-opened on every run so the registry can close indexes nobody is using.
+vector_store = use_latest_index()
+
 # ============================================================================
 # NOTIFICATION POPUP SYSTEM
 # ============================================================================
@@ -191,9 +257,25 @@ page = st.sidebar.radio(
     label_visibility="collapsed"
 )
 
+# Each user has one index per course; the shared index holds material indexed for everyone
+namespaces = {(ns["owner"], ns["course"]): ns for ns in list_namespaces(st.session_state.username)}
+if current_version(namespace_path()) is not None:
+    namespaces[namespace_key()] = {"owner": None, "course": "Shared library"}
+namespaces.setdefault(st.session_state.namespace, {"course": st.session_state.namespace[1] or "Shared library"})
+choices = list(namespaces)
+selected = st.sidebar.selectbox("📚 Study index", choices, index=choices.index(st.session_state.namespace),
+                                format_func=lambda ns: namespaces[ns]["course"])
+if selected != st.session_state.namespace:
+    st.session_state.namespace = selected
+    vector_store = use_latest_index()
+
 if st.sidebar.button("🚪 Logout", use_container_width=True):
     st.session_state.logged_in = False
     st.session_state.username = None
+    # Nothing of this user's indexes, answers or quizzes may carry over to the next login
+    for key in ("namespace", "concept_agent", "quiz_generator", "loaded_jobs", "last_upload",
+                "current_quiz", "quiz_scope", "quiz_answers", "quiz_submitted", "quiz_result_saved"):
+        st.session_state.pop(key, None)
     st.rerun()
 
 st.sidebar.markdown("---")
@@ -240,35 +322,61 @@ if page == "🏠 Home":
 elif page == "📚 Upload Material":
     st.title("📚 Upload Study Material")
     st.markdown("Upload **PDF** or **TXT** files")
+    ingestion_queue = get_ingestion_queue()
+    course = st.text_input("📘 Course (optional)", placeholder="e.g., STAT101",
+                           help="Tag the upload so questions and quizzes can be limited to one course")
     uploaded_file = st.file_uploader("Choose a file", type=["txt", "pdf"])
-    if uploaded_file:
-        file_extension = uploaded_file.name.split('.')[-1].lower()
-        with st.spinner(f"🔄 Processing..."):
-            file_path = os.path.join("data", "study_materials", uploaded_file.name)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            progress = st.progress(0)
-            progress.progress(25, text="Reading...")
-            if file_extension == "pdf":
-                docs = chunk_pdf_text(file_path)
-            else:
-                docs = chunk_text(file_path)
-            progress.progress(50, text="Embeddings...")
-            vs = create_vector_store(docs)
-            progress.progress(75, text="AI setup...")
-            st.session_state.vector_store = vs
-            st.session_state.concept_agent = ConceptExplainerAgent(vs)
-            st.session_state.quiz_generator = QuizGenerator(vs)
-            progress.progress(100, text="Done!")
-            st.success(f"✅ Processed: **{uploaded_file.name}**")
-            col1, col2, col3 = st.columns(3)
+    # The uploader keeps its file across reruns - only enqueue each upload once
+    if uploaded_file and st.session_state.get("last_upload") != (uploaded_file.name, uploaded_file.size):
+        # One folder per user: another user's file with the same name must not replace it before it is indexed.
+        # Kept out of the study materials folder, which bulk ingestion adds to the shared index
+        file_path = os.path.join(USER_DATA_PATH, "uploads",
+                                 re.sub(r"[^A-Za-z0-9_.-]+", "_", st.session_state.username), uploaded_file.name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(uploaded_file.getbuffer())
+        # Each course gets its own index; the session switches to it
+        st.session_state.namespace = namespace_key(st.session_state.username, course.strip() or None)
+        ingestion_queue.enqueue(file_path, owner=st.session_state.username, course=course.strip() or None,
+                                db_path=namespace_path(*st.session_state.namespace))
+        st.session_state.last_upload = (uploaded_file.name, uploaded_file.size)
+        st.info(f"📥 **{uploaded_file.name}** queued for processing. You can keep using the app meanwhile.")
+
+    @st.fragment(run_every="2s")
+    def show_ingestion_jobs():
+        jobs = ingestion_queue.list_jobs(owner=st.session_state.username)[:10]
+        if not jobs:
+            return
+        st.markdown("### 📦 Processing Status")
+        for job in jobs:
+            fraction, label = job_progress(job)
+            st.progress(fraction, text=f"**{job['file_name']}** - {label}")
+        # Pick up newly finished material (once per finished job)
+        finished = {job["id"] for job in jobs if job["status"] == "done"}
+        loaded = st.session_state.setdefault("loaded_jobs", set())
+        if finished - loaded:
+            loaded.update(finished)
+            vs = use_latest_index()
+            if vs is not None:
+                st.success(f"✅ Study material ready - {vs.index.ntotal} chunks indexed for Q&A and quizzes")
+
+    show_ingestion_jobs()
+
+    db_path = namespace_path(*st.session_state.namespace)
+    indexed = [(source, entry) for source, entry in load_manifest(db_path)["files"].items()
+               if not entry.get("alias_of")]
+    if indexed:
+        st.markdown("### 🗂️ Indexed Documents")
+        for source, entry in sorted(indexed):
+            col1, col2 = st.columns([5, 1])
             with col1:
-                st.metric("📄 Chunks", len(docs))
+                st.write(f"📄 **{os.path.basename(source)}** - {entry['chunks']} chunks, "
+                         f"added {entry['indexed_at'][:10]}" + (f" · {entry['course']}" if entry.get("course") else ""))
             with col2:
-                st.metric("🤖 Q&A", "✓")
-            with col3:
-                st.metric("📝 Quiz", "✓")
+                if st.button("🗑️", key=f"delete_doc_{entry['doc_id']}"):
+                    deleted = delete_document(entry["doc_id"], db_path)
+                    st.toast(f"🗑️ Removed {os.path.basename(source)} ({deleted} chunks) from the index")
+                    st.rerun()
 
 # ============================================================================
 # GOAL PLANNING (with persistent multi-alert reminders)
@@ -422,20 +530,29 @@ elif page == "🎯 Goal Planning":
         if not goal:
             st.error("⚠️ Enter a goal!")
         else:
-            with st.spinner("🤖 Creating plan..."):
-                plan = st.session_state.planner.create_study_plan(
+            # Subtasks appear one by one while the rest of the plan is still being generated
+            status = st.status("🤖 Creating plan...", expanded=True)
+            plan = {}
+            for kind, item in st.session_state.planner.create_study_plan_stream(
                     goal=goal,
                     deadline=deadline.strftime("%Y-%m-%d"),
                     daily_hours=int(daily_hours),
                     current_knowledge=level,
-                )
-                if "error" not in plan:
-                    fname = f"{username}_plan_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
-                    with open(f"data/user_data/{fname}", "w") as f:
-                        json.dump(plan, f, indent=2)
-                    st.session_state.current_plan = plan
-                    st.balloons()
-                    st.success("✅ Plan created and saved!")
+            ):
+                if kind == "subtask":
+                    status.write(f"📋 {item.get('task_id', '')}. {item.get('task', '')} "
+                                 f"({item.get('estimated_hours', '?')}h)")
+                else:
+                    plan = item
+            status.update(label="❌ Plan generation failed" if "error" in plan else "✅ Plan ready",
+                          state="error" if "error" in plan else "complete", expanded=False)
+            if "error" not in plan:
+                fname = f"{username}_plan_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+                with open(f"data/user_data/{fname}", "w") as f:
+                    json.dump(plan, f, indent=2)
+                st.session_state.current_plan = plan
+                st.balloons()
+                st.success("✅ Plan created and saved!")
 
     # ==== 4. CURRENT PLAN MANAGEMENT ====
     plan = st.session_state.get("current_plan")
@@ -648,19 +765,18 @@ elif page == "✅ My Tasks":
 elif page == "💬 Ask Questions":
     st.title("💬 AI Assistant")
     
-    if st.session_state.concept_agent is None:
+    if vector_store is None:
         st.warning("⚠️ Upload material first!")
     else:
         st.success("✅ Ready to answer!")
         
+        scope = scope_picker("ask", vector_store)
         question = st.text_input("🤔 Your Question:", placeholder="What is...?")
         
         if st.button("Ask", type="primary") and question:
-            with st.spinner("🤖 Thinking..."):
-                answer = st.session_state.concept_agent.explain_concept(question)
-            
             st.markdown("### 📝 Answer:")
-            st.markdown(f"> {answer}")
+            # Tokens are rendered as they arrive instead of after the whole answer
+            st.write_stream(st.session_state.concept_agent.explain_concept_stream(question, scope=scope))
         
         # Chat History
         if hasattr(st.session_state.concept_agent, 'chat_history'):
@@ -683,7 +799,7 @@ elif page == "💬 Ask Questions":
 elif page == "📝 Take Quiz":
     st.title("📝 Auto-Generated Quiz")
 
-    if st.session_state.quiz_generator is None:
+    if vector_store is None:
         st.warning("⚠️ Upload material first!")
     else:
         # Initialization for quiz submitted state
@@ -700,19 +816,36 @@ elif page == "📝 Take Quiz":
                 num_q = st.number_input("Questions", 3, 10, 5)
             with col3:
                 difficulty = st.selectbox("Difficulty", ["easy", "medium", "hard"])
+            scope = scope_picker("quiz", vector_store)
+            prefetcher = get_quiz_prefetcher()
+            # Weak and recent topics are generated in the background, ready for the next visit
+            prefetcher.prefetch_for_user(st.session_state.username, vector_store,
+                                         st.session_state.performance_tracker, scope)
 
             if st.button("Generate Quiz", type="primary", use_container_width=True):
                 if topic:
-                    with st.spinner("Creating quiz..."):
-                        quiz = st.session_state.quiz_generator.generate_quiz(topic, num_q, difficulty)
-                        if "error" not in quiz:
-                            st.session_state.current_quiz = quiz
-                            st.session_state.quiz_answers = {}
-                            st.session_state.quiz_submitted = False
-                            st.rerun()
+                    quiz = prefetcher.take(st.session_state.username, vector_store,
+                                           topic, difficulty, num_q, scope)
+                    if quiz is None:
+                        with st.spinner("Creating quiz..."):
+                            quiz = st.session_state.quiz_generator.generate_quiz(topic, num_q, difficulty, scope=scope)
+                    if "error" not in quiz:
+                        start_quiz(quiz, scope)
+                        st.rerun()
                 else:
                     st.error("⚠️ Enter a topic!")
 
+            ready = prefetcher.ready(st.session_state.username, vector_store)
+            if ready:
+                st.markdown("#### ⚡ Ready now")
+                for i, params in enumerate(ready):
+                    label = f"{params['topic']} ({params['difficulty']}, {params['num_questions']} questions)"
+                    if st.button(label, key=f"ready_quiz_{i}", use_container_width=True):
+                        quiz = prefetcher.take(st.session_state.username, vector_store, **params)
+                        if quiz is not None:
+                            start_quiz(quiz, params["scope"])
+                        st.rerun()
+
         # Show quiz questions (if not submitted)
         elif not st.session_state.quiz_submitted:
             quiz = st.session_state.current_quiz
@@ -760,10 +893,14 @@ elif page == "📝 Take Quiz":
             # Only save result if not already recorded in this view
             if "quiz_result_saved" not in st.session_state or not st.session_state.quiz_result_saved:
                 st.session_state.performance_tracker.record_quiz_score(
-                    quiz['topic'], score, total
+                    quiz['topic'], score, total, difficulty=quiz.get('difficulty')
                 )
                 st.session_state.quiz_result_saved = True
                 st.success("✅ Results saved to Performance Dashboard!")
+                # Get the next quiz on this topic (and the other weak ones) ready while the answers are read
+                get_quiz_prefetcher().prefetch_for_user(
+                    st.session_state.username, vector_store,
+                    st.session_state.performance_tracker, st.session_state.get("quiz_scope"))
 
             # Reset quiz_result_saved when starting a new quiz
             if st.session_state.current_quiz is None:
@@ -790,10 +927,16 @@ elif page == "📝 Take Quiz":
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("🔄 Take Another Quiz", type="primary", use_container_width=True):
-                    st.session_state.current_quiz = None
-                    st.session_state.quiz_answers = {}
-                    st.session_state.quiz_submitted = False
-                    st.session_state.quiz_result_saved = False
+                    # A prefetched quiz on the same topic starts right away; otherwise pick a new one
+                    settings = st.session_state.performance_tracker.get_usual_quiz_settings()
+                    scope = st.session_state.get("quiz_scope")
+                    next_quiz = get_quiz_prefetcher().take(
+                        st.session_state.username, vector_store, quiz['topic'],
+                        settings["difficulty"], settings["num_questions"], scope)
+                    if next_quiz is not None:
+                        start_quiz(next_quiz, scope)
+                    else:
+                        start_quiz(None)
                     st.rerun()
             with col2:
                 if st.button("📊 View Performance", use_container_width=True):
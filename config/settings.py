@@ -26,14 +26,105 @@ GROQ_MODELS = {
 }
 # Paths
 VECTOR_DB_PATH = 'data/vector_db'
+VECTOR_NAMESPACES_PATH = 'data/vector_namespaces'  # per user / per course indexes: <owner>/<course>/
 STUDY_MATERIALS_PATH = 'data/study_materials'
 USER_DATA_PATH = 'data/user_data'
 
+# Embedding model (loaded lazily, shared by all sessions in a process)
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+EMBEDDING_DEVICE = os.getenv('EMBEDDING_DEVICE', 'cpu')
+EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', 0))  # 0 = torch default
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 32))
+EMBEDDING_WORKERS = int(os.getenv('EMBEDDING_WORKERS', 1))  # >1 shards large uploads over processes
+EMBEDDING_PARALLEL_MIN_CHUNKS = 2000  # below this, a process pool costs more than it saves
+
+# Embedding cache (chunk vectors keyed by model + SHA-256 of the chunk text)
+EMBEDDING_CACHE_PATH = 'data/embedding_cache'
+EMBEDDING_CACHE_MAX_ENTRIES = 200000
+EMBEDDING_CACHE_DTYPE = 'float32'  # or 'float16' to halve disk usage
+
+# PDF extraction
+PDF_EXTRACT_WORKERS = 0        # 0 = one process per CPU core
+PDF_PAGES_PER_TASK = 25        # pages handed to a worker at a time
+PDF_PARALLEL_MIN_PAGES = 50    # smaller PDFs are extracted in-process
+PDF_FAST_ENGINE = os.getenv('PDF_FAST_ENGINE', 'pdfium')  # pdfium / pypdf / pdfplumber
+PDF_GARBLED_THRESHOLD = 0.1    # share of unusable characters that triggers the pdfplumber fallback
+
+# Near-duplicate chunk elimination at ingestion (MinHash + LSH), across all documents of an index;
+# a dropped chunk is indexed after all if the chunk it duplicated is deleted
+DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'true').lower() == 'true'
+DEDUP_THRESHOLD = 0.8          # estimated Jaccard similarity of word shingles that counts as a duplicate
+DEDUP_NUM_PERM = 64            # MinHash permutations per chunk
+DEDUP_SHINGLE_SIZE = 5         # words per shingle
+
+# Vector index type: flat (exact), ivf_flat, hnsw or ivf_pq
+VECTOR_INDEX_TYPE = os.getenv('VECTOR_INDEX_TYPE', 'flat')
+IVF_NLIST = 1024               # IVF cells
+IVF_NPROBE = 16                # cells visited per query
+IVF_MIN_TRAIN_FACTOR = 39      # IVF trains once there are IVF_NLIST * factor vectors
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+PQ_M = 48                      # PQ sub-quantizers, must divide the embedding dimension
+PQ_NBITS = 8
+# Stored vector precision: float32, float16 (half the memory) or int8 (a quarter, scalar-quantized)
+VECTOR_DTYPE = os.getenv('VECTOR_DTYPE', 'float32')
+SQ8_MIN_TRAIN_VECTORS = 1000   # int8 ranges are trained once there are this many vectors (float16 until then)
+INDEX_SNAPSHOTS_KEPT = 3       # published index versions kept on disk (readers may still use older ones)
+COMPACTION_TOMBSTONE_RATIO = 0.2  # deleted share of the index that triggers a background compaction
+
+# Retrieval: dense (FAISS only), lexical (BM25 only) or hybrid (both, fused)
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid')
+HYBRID_ALPHA = 0.6                 # weight of the dense score; 1 - alpha goes to BM25
+HYBRID_CANDIDATES = 4              # each side contributes k * this many candidates
+LEXICAL_FAST_PATH_MAX_TERMS = 2    # queries this short go straight to BM25
+NEIGHBOUR_WINDOW = 1               # chunks on each side of a hit added as context (neighbours=...)
+NEIGHBOUR_CONTEXT_CHARS = 250      # characters kept from each neighbouring chunk
+
+# Retrieval caches (per process, invalidated when the index version changes)
+QUERY_EMBEDDING_CACHE_SIZE = 2048
+SEARCH_RESULTS_CACHE_SIZE = 1024
+OPEN_INDEXES_MAX = 8  # indexes kept loaded per process; the least recently used one is closed beyond this
+
+# Semantic answer cache (reuses an explanation for a reworded question over the same material)
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+SEMANTIC_CACHE_THRESHOLD = 0.92    # cosine similarity of question embeddings that counts as the same question
+SEMANTIC_CACHE_MAX_ENTRIES = 5000  # answers kept per process
+
+# LLM response cache (on disk, shared by all agents and processes)
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_PATH = 'data/llm_cache/responses.sqlite3'
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 5000
+LLM_CACHE_AGENTS = {  # per agent overrides; ttl 0 disables caching for that agent
+    'concept_explainer': {'ttl': 24 * 3600, 'max_entries': 20000},
+    'quiz_generator': {'ttl': 15 * 60, 'max_entries': 2000},  # short: retakes should get new questions
+    'goal_planner': {'ttl': 7 * 24 * 3600, 'max_entries': 1000},
+}
+
+# Background ingestion (uploads are processed by a worker pool, not the page script)
+INGESTION_WORKERS = 2
+
+# Bulk ingestion CLI (python manage_index.py ingest)
+BULK_INGEST_WORKERS = 0        # extraction processes, 0 = one per CPU core
+BULK_INGEST_COMMIT_EVERY = 25  # files per index commit; a rerun resumes after the last commit
+
 # RAG Configuration
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 100
 TOP_K_RESULTS = 3
 
+# Quiz generation: longer quizzes are split into shards generated concurrently
+QUIZ_SHARD_SIZE = 3          # questions per LLM call
+QUIZ_CHUNKS_PER_SHARD = 3    # retrieved chunks given to each shard
+QUIZ_SHARD_RETRIES = 1       # extra attempts for shards that failed (request error or JSON that did not parse)
+QUIZ_SHARD_RETRY_DELAY = 2   # seconds to wait before retrying after a request error (e.g. a rate limit)
+
+# Quiz prefetch (quizzes on each user's weak and recent topics are generated in the background)
+QUIZ_PREFETCH_ENABLED = os.getenv('QUIZ_PREFETCH_ENABLED', 'true').lower() == 'true'
+QUIZ_PREFETCH_PER_USER = 4  # ready quizzes kept per user; the oldest is dropped beyond this
+QUIZ_PREFETCH_WORKERS = 2
+
 # Reminder Configuration
 DEFAULT_REMINDER_HOUR = 9
 DEFAULT_REMINDER_MINUTE = 0
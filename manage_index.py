@@ -0,0 +1,64 @@
+# manage_index.py - command-line maintenance for the study material index
+import argparse
+from config.settings import VECTOR_DB_PATH, VECTOR_INDEX_TYPE, VECTOR_DTYPE, STUDY_MATERIALS_PATH
+from utils.ingestion import ingest_directory
+from utils.index_benchmark import benchmark_vector_dtypes
+from utils.index_registry import namespace_path, list_namespaces
+from utils.vector_store import (INDEX_TYPES, VECTOR_DTYPES, rebuild_vector_store, delete_document,
+                                compact_vector_store)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the FAISS study material index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild", help="Rebuild an existing index with another index type or dtype")
+    rebuild.add_argument("--index-type", choices=INDEX_TYPES, default=VECTOR_INDEX_TYPE)
+    rebuild.add_argument("--vector-dtype", choices=VECTOR_DTYPES, default=VECTOR_DTYPE)
+    rebuild.add_argument("--db-path", default=VECTOR_DB_PATH)
+
+    ingest = commands.add_parser("ingest", help="Index every PDF/TXT under a directory (resumable)")
+    ingest.add_argument("--path", default=STUDY_MATERIALS_PATH)
+    ingest.add_argument("--db-path", default=None, help="Index directory (default: the owner/course namespace, "
+                                                       "or the shared index without --owner)")
+    ingest.add_argument("--workers", type=int, default=None, help="Extraction processes")
+    ingest.add_argument("--commit-every", type=int, default=None, help="Files per index commit")
+    ingest.add_argument("--course", default=None, help="Course tag recorded on every file (for scoped search)")
+    ingest.add_argument("--owner", default=None, help="Owner recorded on every file (selects their namespace)")
+
+    commands.add_parser("list", help="List the shared and per-user/per-course indexes")
+
+    benchmark = commands.add_parser("benchmark", help="Recall@k and memory of float16/int8 vectors vs float32")
+    benchmark.add_argument("--index-type", choices=INDEX_TYPES, default=VECTOR_INDEX_TYPE)
+    benchmark.add_argument("--db-path", default=VECTOR_DB_PATH)
+    benchmark.add_argument("-k", type=int, default=10)
+    benchmark.add_argument("--queries", type=int, default=200)
+
+    delete = commands.add_parser("delete", help="Remove a document from the index by document id")
+    delete.add_argument("doc_id")
+    delete.add_argument("--db-path", default=VECTOR_DB_PATH)
+
+    compact = commands.add_parser("compact", help="Rebuild the index without the vectors of deleted documents")
+    compact.add_argument("--db-path", default=VECTOR_DB_PATH)
+
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        rebuild_vector_store(args.index_type, args.db_path, args.vector_dtype)
+    elif args.command == "ingest":
+        db_path = args.db_path or namespace_path(args.owner, args.course)
+        ingest_directory(args.path, db_path, args.workers, args.commit_every,
+                         tags={"owner": args.owner, "course": args.course})
+    elif args.command == "list":
+        for ns in list_namespaces():
+            name = f"{ns['owner']}/{ns['course']}" if ns["owner"] else "(shared)"
+            print(f"{name:40} v{ns['version']:<6} {ns['documents']:>5} documents  {ns['path']}")
+    elif args.command == "benchmark":
+        benchmark_vector_dtypes(args.db_path, args.index_type, args.k, args.queries)
+    elif args.command == "delete":
+        delete_document(args.doc_id, args.db_path)
+    elif args.command == "compact":
+        compact_vector_store(args.db_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# tests/test_vector_store.py
+import hashlib
+import random
+import faiss
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+import utils.vector_store as vector_store_module
+from utils.vector_store import (
+    compact_vector_store, create_vector_store, current_version, delete_document, is_file_indexed, load_manifest,
+    load_vector_store, search_params, search_vector_store
+)
+
+DIMENSION = 16
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic random vector per text (no model needed)"""
+
+    def _vector(self, text):
+        seed = int(hashlib.sha256(text.encode()).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(DIMENSION).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.fixture
+def small_indexes(monkeypatch):
+    """Small trained indexes, fake embeddings and no background compaction"""
+    fake = HashEmbeddings()
+    monkeypatch.setattr(vector_store_module, "embeddings", fake)
+    monkeypatch.setattr(vector_store_module, "embed_texts",
+                        lambda texts, **kwargs: np.asarray(fake.embed_documents(texts), dtype=np.float32))
+    monkeypatch.setattr(vector_store_module, "IVF_NLIST", 4)
+    monkeypatch.setattr(vector_store_module, "IVF_MIN_TRAIN_FACTOR", 5)
+    monkeypatch.setattr(vector_store_module, "PQ_M", 4)
+    monkeypatch.setattr(vector_store_module, "PQ_NBITS", 4)
+    monkeypatch.setattr(vector_store_module, "VECTOR_DTYPE", "float32")
+    monkeypatch.setattr(vector_store_module, "COMPACTION_TOMBSTONE_RATIO", 2.0)
+    return monkeypatch
+
+
+def _document(path, name, chunks):
+    rng = random.Random(name)
+    texts = [" ".join(f"{name}{rng.randrange(10 ** 6)}" for _ in range(12)) for _ in range(chunks)]
+    path.write_text("\n".join(texts))
+    return str(path), [Document(page_content=text, metadata={}) for text in texts]
+
+
+def _live_texts(db_path):
+    store = load_vector_store(db_path)
+    return [store.docstore.search(chunk_id).page_content
+            for chunk_id in store.index_to_docstore_id.values() if chunk_id not in store.tombstones]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw", "ivf_pq"])
+def test_reingest_after_delete_keeps_positions(tmp_path, small_indexes, index_type):
+    small_indexes.setattr(vector_store_module, "VECTOR_INDEX_TYPE", index_type)
+    db_path = str(tmp_path / "db")
+    path_a, docs_a = _document(tmp_path / "a.txt", "alpha", 60)
+    path_b, docs_b = _document(tmp_path / "b.txt", "beta", 50)
+    create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+    create_vector_store(docs_b, source_path=path_b, db_path=db_path)
+    assert load_manifest(db_path)["files"][path_a.replace("\\", "/")]["chunks"] == 60
+
+    doc_id = load_manifest(db_path)["files"][path_a.replace("\\", "/")]["doc_id"]
+    assert delete_document(doc_id, db_path) == 60
+    # Same content again: the tombstoned chunks are removed from the index for real
+    _, docs_a = _document(tmp_path / "a.txt", "alpha", 60)
+    create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+
+    store = load_vector_store(db_path, mmap=False)
+    assert store.index.ntotal == 110
+    assert not store.tombstones
+    positions = store.index_to_docstore_id
+    texts = [store.docstore.search(positions[i]).page_content for i in range(store.index.ntotal)]
+    queries = np.asarray(HashEmbeddings().embed_documents(texts), dtype=np.float32)
+    _, found = store.index.search(queries, 1, params=search_params(store.index, nprobe=4, ef_search=200))
+    mismatches = sum(1 for i, (position,) in enumerate(found) if position != i)
+    # ivf_pq codes are lossy, the other types find every chunk's own vector
+    assert mismatches <= (len(texts) // 20 if index_type == "ivf_pq" else 0)
+
+
+def test_int8_waits_for_training_sample(tmp_path, small_indexes):
+    small_indexes.setattr(vector_store_module, "VECTOR_INDEX_TYPE", "flat")
+    small_indexes.setattr(vector_store_module, "VECTOR_DTYPE", "int8")
+    small_indexes.setattr(vector_store_module, "SQ8_MIN_TRAIN_VECTORS", 80)
+    db_path = str(tmp_path / "db")
+    path_a, docs_a = _document(tmp_path / "a.txt", "alpha", 30)
+    create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+    manifest = load_manifest(db_path)
+    assert (manifest["vector_dtype"], manifest["trained_on"]) == ("float16", 0)
+
+    path_b, docs_b = _document(tmp_path / "b.txt", "beta", 60)
+    create_vector_store(docs_b, source_path=path_b, db_path=db_path)
+    manifest = load_manifest(db_path)
+    # Retrained on everything indexed so far, not on the first upload
+    assert (manifest["vector_dtype"], manifest["trained_on"]) == ("int8", 90)
+    assert isinstance(faiss.downcast_index(load_vector_store(db_path).index), faiss.IndexScalarQuantizer)
+
+
+def test_full_rebuild_publishes_next_version(tmp_path, small_indexes):
+    small_indexes.setattr(vector_store_module, "VECTOR_INDEX_TYPE", "flat")
+    db_path = str(tmp_path / "db")
+    path_a, docs_a = _document(tmp_path / "a.txt", "alpha", 20)
+    path_b, docs_b = _document(tmp_path / "b.txt", "beta", 10)
+    create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+    create_vector_store(docs_b, source_path=path_b, db_path=db_path)
+    store = create_vector_store(docs_b, source_path=path_b, db_path=db_path, incremental=False)
+    assert current_version(db_path) == 3
+    assert store.index.ntotal == 10
+    assert list(load_manifest(db_path)["files"]) == [path_b.replace("\\", "/")]
+
+
+def test_shared_text_survives_deleting_the_other_document(tmp_path, small_indexes):
+    small_indexes.setattr(vector_store_module, "VECTOR_INDEX_TYPE", "flat")
+    small_indexes.setattr(vector_store_module, "DEDUP_ENABLED", True)
+    db_path = str(tmp_path / "db")
+    path_a, docs_a = _document(tmp_path / "a.txt", "alpha", 10)
+    path_b, docs_b = _document(tmp_path / "b.txt", "beta", 10)
+    shared = docs_a[0].page_content
+    # b repeats a's first chunk (twice: the copy within b itself is dropped)
+    docs_b += [Document(page_content=shared, metadata={}), Document(page_content=shared, metadata={})]
+    tmp_path.joinpath("b.txt").write_text("\n".join(doc.page_content for doc in docs_b))
+    create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+    create_vector_store(docs_b, source_path=path_b, db_path=db_path)
+    # Dropped across documents, not only within b
+    assert load_manifest(db_path)["files"][path_b.replace("\\", "/")]["duplicates"] == 2
+    assert _live_texts(db_path).count(shared) == 1
+
+    delete_document(load_manifest(db_path)["files"][path_a.replace("\\", "/")]["doc_id"], db_path)
+    live = _live_texts(db_path)
+    assert live.count(shared) == 1
+    assert sorted(live) == sorted(doc.page_content for doc in docs_b[:11])
+    entry_b = load_manifest(db_path)["files"][path_b.replace("\\", "/")]
+    assert entry_b["duplicates"] == 1
+    # b's restored copy goes with b
+    assert delete_document(entry_b["doc_id"], db_path) == 11
+    assert _live_texts(db_path) == []
+
+
+def test_shared_text_survives_changing_the_other_document(tmp_path, small_indexes):
+    small_indexes.setattr(vector_store_module, "VECTOR_INDEX_TYPE", "hnsw")
+    small_indexes.setattr(vector_store_module, "DEDUP_ENABLED", True)
+    db_path = str(tmp_path / "db")
+    path_a, docs_a = _document(tmp_path / "a.txt", "alpha", 10)
+    path_b, docs_b = _document(tmp_path / "b.txt", "beta", 10)
+    shared = docs_a[3].page_content
+    docs_b.append(Document(page_content=shared, metadata={}))
+    tmp_path.joinpath("b.txt").write_text("\n".join(doc.page_content for doc in docs_b))
+    create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+    create_vector_store(docs_b, source_path=path_b, db_path=db_path)
+    path_a, docs_a = _document(tmp_path / "a.txt", "gamma", 10)
+    create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+
+    assert sorted(_live_texts(db_path)) == sorted(doc.page_content for doc in docs_a + docs_b)
+
+
+def test_alias_keeps_chunks_when_original_changes(tmp_path, small_indexes):
+    small_indexes.setattr(vector_store_module, "VECTOR_INDEX_TYPE", "flat")
+    db_path = str(tmp_path / "db")
+    path_a, docs_a = _document(tmp_path / "a.txt", "alpha", 10)
+    path_b, docs_b = _document(tmp_path / "b.txt", "alpha", 10)
+    create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+    create_vector_store(docs_b, source_path=path_b, db_path=db_path)
+    path_a, docs_a = _document(tmp_path / "a.txt", "gamma", 10)
+    create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+
+    entry_b = load_manifest(db_path)["files"][path_b.replace("\\", "/")]
+    assert "alias_of" not in entry_b
+    assert is_file_indexed(path_b, db_path)
+    live = _live_texts(db_path)
+    assert all(doc.page_content in live for doc in docs_b)
+    assert delete_document(entry_b["doc_id"], db_path) == 10
+    assert len(_live_texts(db_path)) == 10
+
+
+def test_changed_file_matching_another_drops_its_old_chunks(tmp_path, small_indexes):
+    small_indexes.setattr(vector_store_module, "VECTOR_INDEX_TYPE", "flat")
+    db_path = str(tmp_path / "db")
+    path_a, docs_a = _document(tmp_path / "a.txt", "alpha", 10)
+    path_c, docs_c = _document(tmp_path / "c.txt", "gamma", 10)
+    create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+    create_vector_store(docs_c, source_path=path_c, db_path=db_path)
+    path_a, docs_a = _document(tmp_path / "a.txt", "gamma", 10)
+    create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+
+    assert load_manifest(db_path)["files"][path_a.replace("\\", "/")]["alias_of"] == path_c.replace("\\", "/")
+    assert sorted(_live_texts(db_path)) == sorted(doc.page_content for doc in docs_c)
+
+
+def test_keyword_query_tops_up_short_lexical_hits(tmp_path, small_indexes):
+    small_indexes.setattr(vector_store_module, "VECTOR_INDEX_TYPE", "flat")
+    db_path = str(tmp_path / "db")
+    path_a, docs_a = _document(tmp_path / "a.txt", "alpha", 10)
+    store = create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+    keyword = docs_a[0].page_content.split()[0]
+
+    results = search_vector_store(store, keyword, k=2, mode="hybrid")
+    assert len(results) == 2
+    assert results[0].page_content == docs_a[0].page_content
+
+
+@pytest.mark.parametrize("index_type, dtype, decodes", [
+    ("ivf_flat", "float32", True), ("ivf_flat", "float16", True), ("hnsw", "float16", True),
+    ("flat", "float16", True), ("ivf_pq", "float32", False),
+])
+def test_compaction_reuses_decodable_vectors(tmp_path, small_indexes, index_type, dtype, decodes):
+    small_indexes.setattr(vector_store_module, "VECTOR_INDEX_TYPE", index_type)
+    small_indexes.setattr(vector_store_module, "VECTOR_DTYPE", dtype)
+    db_path = str(tmp_path / "db")
+    path_a, docs_a = _document(tmp_path / "a.txt", "alpha", 60)
+    path_b, docs_b = _document(tmp_path / "b.txt", "beta", 50)
+    create_vector_store(docs_a, source_path=path_a, db_path=db_path)
+    create_vector_store(docs_b, source_path=path_b, db_path=db_path)
+    delete_document(load_manifest(db_path)["files"][path_a.replace("\\", "/")]["doc_id"], db_path)
+
+    embedded = []
+    fake = HashEmbeddings()
+
+    def embed_texts(texts, **kwargs):
+        embedded.extend(texts)
+        return np.asarray(fake.embed_documents(texts), dtype=np.float32)
+
+    small_indexes.setattr(vector_store_module, "embed_texts", embed_texts)
+    store = compact_vector_store(db_path)
+    assert store.index.ntotal == 50
+    assert len(embedded) == (0 if decodes else 50)
+    positions = store.index_to_docstore_id
+    texts = [store.docstore.search(positions[i]).page_content for i in range(store.index.ntotal)]
+    queries = np.asarray(fake.embed_documents(texts), dtype=np.float32)
+    _, found = store.index.search(queries, 1, params=search_params(store.index, nprobe=4, ef_search=200))
+    assert sum(1 for i, (position,) in enumerate(found) if position != i) <= (5 if index_type == "ivf_pq" else 0)
@@ -1,20 +1,53 @@
 # tools/quiz_generator.py
 from langchain_groq import ChatGroq
 from langchain_core.messages import SystemMessage, HumanMessage
-from config.settings import GROQ_API_KEY, GROQ_MODEL
+from config.settings import (
+    GROQ_API_KEY, GROQ_MODEL, LLM_CACHE_ENABLED, QUIZ_SHARD_SIZE, QUIZ_CHUNKS_PER_SHARD, QUIZ_SHARD_RETRIES,
+    QUIZ_SHARD_RETRY_DELAY
+)
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import json
 import datetime
+import time
+from utils.llm_cache import CachedLLM
+
+
+def _run_async(coroutine):
+    """Run a coroutine to completion from synchronous code (even inside a running event loop)"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coroutine).result()
+
 
 class QuizGenerator:
-    def __init__(self, vector_store):
-        self.llm = ChatGroq(
+    def __init__(self, vector_store=None, scope=None, cache=True, db_path=None):
+        # cache=False always asks the model, so a retake gets new questions
+        self.llm = CachedLLM(ChatGroq(
             model=GROQ_MODEL,
             temperature=0.3,
             groq_api_key=GROQ_API_KEY
-        )
+        ), "quiz_generator", enabled=LLM_CACHE_ENABLED and cache)
         self.vector_store = vector_store
+        # Index directory used instead of vector_store, looked up in the shared registry per quiz
+        self.db_path = db_path
+        self.scope = scope  # default search scope, e.g. {"course": "STAT101"}
+
+    @property
+    def vector_store(self):
+        if self.db_path is not None:
+            from utils.vector_store import get_vector_store
+            return get_vector_store(self.db_path)
+        return self._vector_store
+
+    @vector_store.setter
+    def vector_store(self, vector_store):
+        self._vector_store = vector_store
     
-    def generate_quiz(self, topic, num_questions=5, difficulty="medium"):
+    def generate_quiz(self, topic, num_questions=5, difficulty="medium", scope=None, sharded=None):
         """
         Generate quiz questions from study material
         
@@ -22,15 +55,150 @@ class QuizGenerator:
             topic: Topic to generate quiz about
             num_questions: Number of questions (default: 5)
             difficulty: easy/medium/hard
+            scope: Material to draw questions from (default self.scope, see search_vector_store)
+            sharded: Generate the questions in concurrent shards (default: when there are
+                     more than QUIZ_SHARD_SIZE questions, see generate_quiz_sharded)
         
         Returns:
             dict: Quiz with questions, options, and answers
         """
+        if sharded is None:
+            sharded = num_questions > QUIZ_SHARD_SIZE
+        if sharded:
+            return self.generate_quiz_sharded(topic, num_questions, difficulty, scope)
+
         # Retrieve relevant content
         from utils.vector_store import search_vector_store
-        results = search_vector_store(self.vector_store, topic, k=5)
+        results = search_vector_store(self.vector_store, topic, k=5, scope=scope or self.scope)
         context = "\n\n".join([doc.page_content for doc in results])
+        messages = self._quiz_messages(topic, num_questions, difficulty, context)
+        
+        print(f"🎯 Generating {num_questions} quiz questions about {topic}...")
+        response = self.llm.invoke(messages)
         
+        try:
+            quiz = self._parse_quiz(response.content)
+            quiz['generated_at'] = datetime.datetime.now().isoformat()
+            
+            print(f"✅ Quiz generated successfully!")
+            return quiz
+            
+        except json.JSONDecodeError as e:
+            self.llm.forget(messages)
+            print(f"❌ Error parsing quiz: {e}")
+            print(f"Response content: {response.content[:500]}")
+            return {
+                "error": "Failed to generate quiz",
+                "raw_response": response.content
+            }
+        except Exception as e:
+            print(f"❌ Unexpected error: {e}")
+            return {
+                "error": str(e),
+                "raw_response": response.content if hasattr(response, 'content') else "No response"
+            }
+
+    def generate_quiz_sharded(self, topic, num_questions=10, difficulty="medium", scope=None):
+        """
+        Generate a quiz as concurrent shards of at most QUIZ_SHARD_SIZE questions
+
+        Each shard writes its questions from its own group of retrieved chunks, so a
+        long quiz takes about as long as a short one and covers more of the material.
+        Shards that fail (request error or invalid JSON) are retried without
+        regenerating the others; the questions are then merged, de-duplicated and
+        renumbered, and any that are still missing are asked for once more.
+        """
+        from utils.vector_store import search_vector_store
+        sizes = [QUIZ_SHARD_SIZE] * (num_questions // QUIZ_SHARD_SIZE)
+        if num_questions % QUIZ_SHARD_SIZE:
+            sizes.append(num_questions % QUIZ_SHARD_SIZE)
+        results = search_vector_store(self.vector_store, topic, k=len(sizes) * QUIZ_CHUNKS_PER_SHARD,
+                                      scope=scope or self.scope)
+        # Deal chunks round-robin so every shard gets some of the best matches
+        groups = [results[i::len(sizes)] or results for i in range(len(sizes))]
+        shards = [self._quiz_messages(topic, size, difficulty, "\n\n".join(doc.page_content for doc in group))
+                  for size, group in zip(sizes, groups)]
+
+        print(f"🎯 Generating {num_questions} quiz questions about {topic} in {len(shards)} shards...")
+        questions, last_failure = self._run_shards(shards)
+        merged = self._merge_questions(questions, num_questions)
+        if 0 < len(merged) < num_questions:
+            # Failed shards or duplicate questions left the quiz short: ask for the rest
+            missing = num_questions - len(merged)
+            print(f"➕ {missing} questions short, generating more...")
+            context = "\n\n".join(doc.page_content for doc in results)
+            top_up = self._quiz_messages(topic, missing, difficulty, context,
+                                         avoid=[question["question"] for question in merged])
+            more, _ = self._run_shards([top_up])
+            merged = self._merge_questions([merged] + more, num_questions)
+        if not merged:
+            print("❌ Error generating quiz: no shard returned valid questions")
+            return {
+                "error": "Failed to generate quiz",
+                "raw_response": last_failure
+            }
+        if len(merged) < num_questions:
+            print(f"⚠️ Only {len(merged)} of {num_questions} questions could be generated")
+
+        print(f"✅ Quiz generated successfully! ({len(merged)} questions)")
+        return {
+            "topic": topic,
+            "difficulty": difficulty,
+            "questions": merged,
+            "generated_at": datetime.datetime.now().isoformat()
+        }
+
+    def _run_shards(self, shards):
+        """
+        Send shard prompts concurrently, retrying failed ones up to QUIZ_SHARD_RETRIES times
+
+        Returns:
+            tuple: (question list per shard, None where it kept failing; last failure)
+        """
+        questions = [None] * len(shards)
+        pending = list(range(len(shards)))
+        last_failure = ""
+        for attempt in range(QUIZ_SHARD_RETRIES + 1):
+            responses = _run_async(self.llm.abatch([shards[i] for i in pending], return_exceptions=True))
+            failed = []
+            request_error = False
+            for i, response in zip(pending, responses):
+                if isinstance(response, Exception):
+                    # e.g. a rate limit or network error; nothing was cached
+                    last_failure = f"{type(response).__name__}: {response}"
+                    request_error = True
+                    failed.append(i)
+                    continue
+                try:
+                    questions[i] = list(self._parse_quiz(response.content)["questions"])
+                except (ValueError, KeyError, TypeError):
+                    self.llm.forget(shards[i])
+                    last_failure = response.content
+                    failed.append(i)
+            if not failed:
+                break
+            retrying = attempt < QUIZ_SHARD_RETRIES
+            print(f"⚠️ {len(failed)} of {len(shards)} quiz shards failed ({last_failure[:100]})"
+                  + (", retrying..." if retrying else ""))
+            if retrying and request_error:
+                time.sleep(QUIZ_SHARD_RETRY_DELAY)
+            pending = failed
+        return questions, last_failure
+
+    def _merge_questions(self, shards, num_questions):
+        """Questions of all shards without repeats, renumbered from 1 (at most num_questions)"""
+        merged, seen = [], set()
+        for shard in shards:
+            for question in shard or []:
+                if not isinstance(question, dict):
+                    continue
+                text = " ".join(str(question.get("question", "")).lower().split())
+                if text and text not in seen:
+                    seen.add(text)
+                    merged.append(dict(question, id=len(merged) + 1))
+        return merged[:num_questions]
+
+    def _quiz_messages(self, topic, num_questions, difficulty, context, avoid=()):
         prompt = f"""You are a quiz generator. Create a multiple-choice quiz based on the following study material.
 
 Study Material:
@@ -60,40 +228,22 @@ Return ONLY valid JSON in this format:
 }}
 
 Make questions clear, relevant to the study material, and appropriately challenging."""
+        if avoid:
+            prompt += "\n\nDo not repeat any of these questions:\n" + "\n".join(f"- {question}" for question in avoid)
 
-        messages = [
+        return [
             SystemMessage(content="You are an expert educational quiz generator. Always return valid JSON."),
             HumanMessage(content=prompt)
         ]
+
+    def _parse_quiz(self, response_content):
+        """Quiz dict from an LLM response (raises json.JSONDecodeError if it is not JSON)"""
+        content = response_content.strip()
         
-        print(f"🎯 Generating {num_questions} quiz questions about {topic}...")
-        response = self.llm.invoke(messages)
+        # Extract JSON from markdown code blocks if present
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
         
-        try:
-            content = response.content.strip()
-            
-            # Extract JSON from markdown code blocks if present
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-            
-            quiz = json.loads(content)
-            quiz['generated_at'] = datetime.datetime.now().isoformat()
-            
-            print(f"✅ Quiz generated successfully!")
-            return quiz
-            
-        except json.JSONDecodeError as e:
-            print(f"❌ Error parsing quiz: {e}")
-            print(f"Response content: {response.content[:500]}")
-            return {
-                "error": "Failed to generate quiz",
-                "raw_response": response.content
-            }
-        except Exception as e:
-            print(f"❌ Unexpected error: {e}")
-            return {
-                "error": str(e),
-                "raw_response": response.content if hasattr(response, 'content') else "No response"
-            }
+        return json.loads(content)
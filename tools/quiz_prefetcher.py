@@ -0,0 +1,143 @@
+# tools/quiz_prefetcher.py
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import QUIZ_PREFETCH_ENABLED, QUIZ_PREFETCH_PER_USER, QUIZ_PREFETCH_WORKERS
+from tools.quiz_generator import QuizGenerator
+from utils.llm_cache import normalize_text
+from utils.vector_store import scope_key
+
+
+class QuizPrefetcher:
+    """
+    Quizzes generated in the background before the user asks for them
+
+    Each user has a pool of at most per_user ready quizzes (oldest dropped first),
+    keyed by index, topic, difficulty, length and scope. A quiz is served once and
+    only while the index it was generated from is still the published version:
+    re-ingesting or deleting a document makes the pooled quizzes of that index stale.
+    """
+
+    def __init__(self, workers=QUIZ_PREFETCH_WORKERS, per_user=QUIZ_PREFETCH_PER_USER, enabled=QUIZ_PREFETCH_ENABLED):
+        self.per_user = per_user
+        self.enabled = enabled
+        self.pools = {}        # user -> OrderedDict(key -> (index version, params, quiz)), oldest first
+        self.pending = set()   # (user, key) being generated
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quiz-prefetch")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(vector_store, topic, difficulty, num_questions, scope):
+        return (getattr(vector_store, "db_path", id(vector_store)), normalize_text(topic).lower(),
+                difficulty, num_questions, scope_key(scope))
+
+    def _live_pool(self, user, vector_store):
+        """The user's pool without quizzes from replaced versions of vector_store's index"""
+        pool = self.pools.setdefault(user, OrderedDict())
+        db_path = getattr(vector_store, "db_path", id(vector_store))
+        version = getattr(vector_store, "index_version", None)
+        for key in [key for key, entry in pool.items() if key[0] == db_path and entry[0] != version]:
+            del pool[key]
+        return pool
+
+    def prefetch(self, user, vector_store, topics, difficulty="medium", num_questions=5, scope=None):
+        """
+        Queue generation of quizzes on topics (most wanted first) that are not ready yet
+
+        Returns:
+            int: Number of quizzes queued
+        """
+        queued = 0
+        if not self.enabled:
+            return queued
+        with self._lock:
+            pool = self._live_pool(user, vector_store)
+            # At most per_user generations in flight per user
+            slots = self.per_user - sum(1 for pending_user, _ in self.pending if pending_user == user)
+            for topic in topics[:self.per_user]:
+                key = self._key(vector_store, topic, difficulty, num_questions, scope)
+                if key in pool or (user, key) in self.pending:
+                    continue
+                if queued == slots:
+                    break
+                self.pending.add((user, key))
+                params = {"topic": topic, "difficulty": difficulty, "num_questions": num_questions, "scope": scope}
+                self.executor.submit(self._generate, user, key, vector_store, params)
+                queued += 1
+        if queued:
+            print(f"⏳ Prefetching {queued} quiz(zes) for {user}")
+        return queued
+
+    def prefetch_for_user(self, user, vector_store, tracker, scope=None):
+        """Prefetch quizzes on the user's weak topics, then recent ones, at their usual difficulty and length"""
+        topics, seen = [], set()
+        for topic in tracker.get_weak_topics()[::-1] + tracker.get_recent_topics(self.per_user):
+            name = normalize_text(topic).lower()
+            if name not in seen:
+                seen.add(name)
+                topics.append(topic)
+        settings = tracker.get_usual_quiz_settings()
+        return self.prefetch(user, vector_store, topics, settings["difficulty"], settings["num_questions"], scope)
+
+    def _generate(self, user, key, vector_store, params):
+        version = getattr(vector_store, "index_version", None)
+        try:
+            # Uncached, so a pooled retake does not repeat the questions just answered
+            quiz = QuizGenerator(vector_store, cache=False).generate_quiz(
+                params["topic"], params["num_questions"], params["difficulty"], scope=params["scope"])
+        except Exception as e:
+            print(f"❌ Prefetching a quiz on {params['topic']} failed: {e}")
+            quiz = None
+        with self._lock:
+            self.pending.discard((user, key))
+            if quiz is None or "error" in quiz:
+                return
+            pool = self.pools.setdefault(user, OrderedDict())
+            pool[key] = (version, params, quiz)
+            pool.move_to_end(key)
+            while len(pool) > self.per_user:
+                pool.popitem(last=False)
+
+    def take(self, user, vector_store, topic, difficulty="medium", num_questions=5, scope=None):
+        """Remove and return a ready quiz matching the request (None if there is none)"""
+        with self._lock:
+            entry = self._live_pool(user, vector_store).pop(
+                self._key(vector_store, topic, difficulty, num_questions, scope), None)
+            if entry is None or entry[0] != getattr(vector_store, "index_version", None):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[2]
+
+    def ready(self, user, vector_store):
+        """Parameters of the user's ready quizzes for vector_store, newest first (pass to take())"""
+        with self._lock:
+            db_path = getattr(vector_store, "db_path", id(vector_store))
+            return [dict(entry[1]) for key, entry in reversed(self._live_pool(user, vector_store).items())
+                    if key[0] == db_path]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        with self._lock:
+            return {
+                "ready": sum(len(pool) for pool in self.pools.values()),
+                "pending": len(self.pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_quiz_prefetcher():
+    """Process-wide quiz prefetcher shared by all Streamlit sessions"""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = QuizPrefetcher()
+        return _prefetcher
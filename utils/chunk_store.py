@@ -0,0 +1,147 @@
+# utils/chunk_store.py - on-disk docstore that reads chunk text on demand
+import json
+import mmap
+import os
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+CHUNKS_FILE = "chunks.jsonl"
+OFFSETS_FILE = "chunks.offsets.npy"
+IDS_FILE = "chunks.ids.json"
+
+
+def _replace_atomically(path, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class ChunkStore(Docstore, AddableMixin):
+    """
+    Chunk texts and metadata kept on disk instead of a pickled dict
+
+    chunks.jsonl        one {"id", "text", "metadata"} JSON record per line (append-only)
+    chunks.offsets.npy  byte offset of each record, memory-mapped
+    chunks.ids.json     chunk id of each record
+
+    Only the records that are actually looked up (the top-k hits) are parsed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._pending = {}  # chunks added since the last save
+        self._id_to_record = {}
+        self._offsets = np.zeros(0, dtype=np.int64)
+        self._ids = []
+        self._data = None
+        self._open()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _open(self):
+        if not os.path.exists(self._file(IDS_FILE)):
+            return
+        with open(self._file(IDS_FILE), 'r') as f:
+            self._ids = json.load(f)
+        self._offsets = np.load(self._file(OFFSETS_FILE), mmap_mode='r')
+        self._id_to_record = {chunk_id: i for i, chunk_id in enumerate(self._ids) if chunk_id is not None}
+        self._map_data()
+
+    def _map_data(self):
+        if self._data is not None:
+            self._data.close()
+        self._data = None
+        if os.path.getsize(self._file(CHUNKS_FILE)) > 0:
+            with open(self._file(CHUNKS_FILE), 'rb') as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _read_record(self, record):
+        start = int(self._offsets[record])
+        end = self._data.find(b"\n", start)
+        return json.loads(self._data[start:end if end != -1 else len(self._data)])
+
+    def search(self, search):
+        """Return the Document for a chunk id (a message string if missing, like InMemoryDocstore)"""
+        if search in self._pending:
+            return self._pending[search]
+        record = self._id_to_record.get(search)
+        if record is None:
+            return f"ID {search} not found."
+        data = self._read_record(record)
+        return Document(id=data["id"], page_content=data["text"], metadata=data["metadata"])
+
+    def add(self, texts):
+        """Stage {id: Document} chunks; they are written by save()"""
+        overlapping = {chunk_id for chunk_id in texts if chunk_id in self._id_to_record or chunk_id in self._pending}
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._pending.update(texts)
+
+    def delete(self, ids):
+        """Forget chunks (their bytes stay in chunks.jsonl until the store is rewritten)"""
+        for chunk_id in ids:
+            if self._pending.pop(chunk_id, None) is None:
+                record = self._id_to_record.pop(chunk_id, None)
+                if record is None:
+                    raise ValueError(f"Tried to delete ids that does not exist: {chunk_id}")
+                self._ids[record] = None
+
+    def __len__(self):
+        return len(self._id_to_record) + len(self._pending)
+
+    def ids(self):
+        return list(self._id_to_record) + list(self._pending)
+
+    def flush(self):
+        """
+        Append staged chunks to chunks.jsonl so they no longer take memory
+
+        Flushed chunks are readable from this store but are only recorded in the
+        offset and id files by save(); if the process dies first, their bytes are
+        simply unreferenced.
+        """
+        if not self._pending:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        new_offsets = []
+        with open(self._file(CHUNKS_FILE), 'ab') as f:
+            position = f.tell()
+            for chunk_id, doc in self._pending.items():
+                line = json.dumps({"id": chunk_id, "text": doc.page_content, "metadata": doc.metadata},
+                                  ensure_ascii=False).encode('utf-8') + b"\n"
+                new_offsets.append(position)
+                f.write(line)
+                position += len(line)
+        first = len(self._ids)
+        self._offsets = np.concatenate([np.asarray(self._offsets), np.asarray(new_offsets, dtype=np.int64)])
+        self._ids = self._ids + list(self._pending)
+        self._id_to_record.update((chunk_id, first + i) for i, chunk_id in enumerate(self._pending))
+        self._pending = {}
+        self._map_data()
+
+    def save(self):
+        """Append staged chunks to chunks.jsonl and rewrite the offset and id files"""
+        os.makedirs(self.path, exist_ok=True)
+        if not os.path.exists(self._file(CHUNKS_FILE)):
+            open(self._file(CHUNKS_FILE), 'ab').close()
+        self.flush()
+        offsets, ids = self._offsets, self._ids
+        _replace_atomically(self._file(OFFSETS_FILE), lambda f: np.save(f, offsets))
+        _replace_atomically(self._file(IDS_FILE), lambda f: f.write(json.dumps(ids).encode('utf-8')))
+        self._open()
+
+    @classmethod
+    def write_new(cls, path, documents):
+        """Write a fresh store at path from {id: Document} (replaces any existing chunk files)"""
+        os.makedirs(path, exist_ok=True)
+        _replace_atomically(os.path.join(path, CHUNKS_FILE), lambda f: None)
+        for name in (OFFSETS_FILE, IDS_FILE):
+            if os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+        store = cls(path)
+        store.add(documents)
+        store.save()
+        return store
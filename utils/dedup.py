@@ -0,0 +1,192 @@
+# utils/dedup.py - near-duplicate chunk detection with MinHash + LSH
+import json
+import os
+import zlib
+from collections import defaultdict
+import numpy as np
+from langchain_core.documents import Document
+from config.settings import DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_SHINGLE_SIZE
+from utils.lexical_index import tokenize
+
+SIGNATURES_FILE = "dedup.signatures.npy"
+IDS_FILE = "dedup.ids.json"
+DROPPED_FILE = "dedup.dropped.json"
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+
+
+def _lsh_shape(num_perm, threshold):
+    """(bands, rows) whose LSH threshold (1/bands)**(1/rows) is closest to threshold"""
+    shapes = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    return min(shapes, key=lambda shape: abs((1 / shape[0]) ** (1 / shape[1]) - threshold))
+
+
+def _document_of(chunk_id):
+    """Document id part of a "<doc_id>:<chunk number>" chunk id"""
+    return chunk_id.rsplit(":", 1)[0]
+
+
+class DedupIndex:
+    """
+    MinHash signatures of indexed chunks, bucketed by LSH band
+
+    A chunk is a near-duplicate when it shares a band with an indexed chunk and
+    their estimated Jaccard similarity over word shingles reaches the threshold.
+    Dropped chunks are kept (dedup.dropped.json) against the chunk they duplicate,
+    so one copy can be indexed when that chunk is deleted (see orphans).
+    Signatures are stored in dedup.signatures.npy / dedup.ids.json in the index
+    directory; the band buckets are rebuilt on load.
+    """
+
+    def __init__(self, num_perm=DEDUP_NUM_PERM, threshold=DEDUP_THRESHOLD, shingle_size=DEDUP_SHINGLE_SIZE):
+        self.num_perm = num_perm
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _lsh_shape(num_perm, threshold)
+        # Fixed seed: signatures must stay comparable across runs
+        rng = np.random.default_rng(557)
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.signatures = {}               # chunk id -> uint32 signature
+        self.buckets = defaultdict(set)    # (band, band hash) -> chunk ids
+        self.dropped = {}                  # dropped chunk id -> (id of the chunk it duplicates, Document)
+
+    def signature(self, text):
+        """MinHash signature of a text (None if it has no words)"""
+        words = tokenize(text)
+        if not words:
+            return None
+        size = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64,
+                             count=len(shingles))
+        permuted = (hashes[:, None] * self._a + self._b) % _PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def find_duplicate(self, signature):
+        """Chunk id of an indexed near-duplicate, or None"""
+        if signature is None:
+            return None
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        for chunk_id in candidates:
+            if np.mean(self.signatures[chunk_id] == signature) >= self.threshold:
+                return chunk_id
+        return None
+
+    def add(self, chunk_id, signature):
+        if signature is None:
+            return
+        self.signatures[chunk_id] = signature
+        for key in self._band_keys(signature):
+            self.buckets[key].add(chunk_id)
+
+    def remove(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            self.dropped.pop(chunk_id, None)
+            signature = self.signatures.pop(chunk_id, None)
+            if signature is None:
+                continue
+            for key in self._band_keys(signature):
+                self.buckets[key].discard(chunk_id)
+                if not self.buckets[key]:
+                    del self.buckets[key]
+
+    def forget_documents(self, doc_ids):
+        """Discard the dropped chunks of deleted documents"""
+        doc_ids = set(doc_ids)
+        for chunk_id in [chunk_id for chunk_id in self.dropped if _document_of(chunk_id) in doc_ids]:
+            del self.dropped[chunk_id]
+
+    def orphans(self, chunk_ids):
+        """
+        Take back dropped chunks whose indexed copy is among chunk_ids (being deleted)
+
+        One dropped chunk per deleted chunk is returned to be indexed and registered in
+        its place; the other copies are recorded as duplicates of it. Call
+        forget_documents for the deleted documents first.
+
+        Returns:
+            list: (chunk id, Document) of the chunks to index
+        """
+        chunk_ids = set(chunk_ids)
+        replacements = {}
+        for dropped_id, (original, doc) in list(self.dropped.items()):
+            if original not in chunk_ids:
+                continue
+            if original in replacements:
+                self.dropped[dropped_id] = (replacements[original][0], doc)
+            else:
+                replacements[original] = (dropped_id, doc)
+                del self.dropped[dropped_id]
+        return list(replacements.values())
+
+    def filter(self, chunk_ids, documents):
+        """
+        Drop near-duplicates of indexed chunks (and of each other) and register the rest
+
+        Returns:
+            tuple: (kept chunk ids, kept documents, number dropped)
+        """
+        kept_ids, kept_docs = [], []
+        for chunk_id, doc in zip(chunk_ids, documents):
+            signature = self.signature(doc.page_content)
+            original = self.find_duplicate(signature)
+            if original is not None:
+                self.dropped[chunk_id] = (original, doc)
+                continue
+            self.add(chunk_id, signature)
+            kept_ids.append(chunk_id)
+            kept_docs.append(doc)
+        return kept_ids, kept_docs, len(chunk_ids) - len(kept_ids)
+
+    def save(self, path):
+        """Write the signatures into the index directory"""
+        ids = list(self.signatures)
+        matrix = np.vstack([self.signatures[i] for i in ids]) if ids else \
+            np.zeros((0, self.num_perm), dtype=np.uint32)
+        file_path = os.path.join(path, SIGNATURES_FILE)
+        with open(file_path + ".tmp", 'wb') as f:
+            np.save(f, matrix)
+        os.replace(file_path + ".tmp", file_path)
+        with open(os.path.join(path, IDS_FILE + ".tmp"), 'w') as f:
+            json.dump(ids, f)
+        os.replace(os.path.join(path, IDS_FILE + ".tmp"), os.path.join(path, IDS_FILE))
+        dropped = {chunk_id: {"of": original, "text": doc.page_content, "metadata": doc.metadata}
+                   for chunk_id, (original, doc) in self.dropped.items()}
+        with open(os.path.join(path, DROPPED_FILE + ".tmp"), 'w') as f:
+            json.dump(dropped, f)
+        os.replace(os.path.join(path, DROPPED_FILE + ".tmp"), os.path.join(path, DROPPED_FILE))
+
+    @classmethod
+    def load(cls, path):
+        """Load signatures from an index directory (None if there are none or the settings changed)"""
+        if not os.path.exists(os.path.join(path, IDS_FILE)):
+            return None
+        index = cls()
+        matrix = np.load(os.path.join(path, SIGNATURES_FILE))
+        if matrix.shape[1] != index.num_perm:
+            return None
+        with open(os.path.join(path, IDS_FILE), 'r') as f:
+            ids = json.load(f)
+        for chunk_id, signature in zip(ids, matrix):
+            index.add(chunk_id, signature)
+        if os.path.exists(os.path.join(path, DROPPED_FILE)):
+            with open(os.path.join(path, DROPPED_FILE), 'r') as f:
+                index.dropped = {chunk_id: (record["of"], Document(page_content=record["text"],
+                                                                   metadata=record["metadata"]))
+                                 for chunk_id, record in json.load(f).items()}
+        return index
+
+    @classmethod
+    def build(cls, chunk_ids, docstore):
+        """Sign existing chunks (used for stores created before deduplication existed)"""
+        index = cls()
+        for chunk_id in chunk_ids:
+            index.add(chunk_id, index.signature(docstore.search(chunk_id).page_content))
+        return index
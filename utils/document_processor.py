@@ -1,23 +1,141 @@
 # utils/document_processor.py
+import re
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+READ_BLOCK_CHARS = 1 << 20  # characters read from disk at a time
+CHUNK_BATCH_SIZE = 256      # chunks per yielded batch
+
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*$")
+NUMBERED_HEADING = re.compile(r"^(\d{1,2}(?:\.\d{1,2}){0,3})\.?\s+([A-Z][^.!?:;,]{1,78})$")
+
+
+class HeadingTracker:
+    """
+    Follows the headings seen so far in a document, giving each chunk its heading path
+
+    Recognizes markdown headings (## Title), numbered sections (2.3 Variance) and
+    short ALL-CAPS lines. Text is fed in order through advance(), using absolute
+    offsets so blocks and pages can be scanned one after another.
+    """
+
+    def __init__(self):
+        self.stack = []    # [(level, title)]
+        self.scanned = 0   # absolute offset of the first line not yet read
+        self.ignored = set()  # lines that look like headings but aren't (running page headers)
+
+    def _heading(self, line):
+        line = line.strip()
+        if not line or len(line) > 80 or line in self.ignored:
+            return None
+        match = MARKDOWN_HEADING.match(line)
+        if match:
+            return len(match.group(1)), match.group(2)
+        match = NUMBERED_HEADING.match(line)
+        if match and len(match.group(2).split()) <= 10:
+            return match.group(1).count(".") + 1, line
+        letters = sum(c.isalpha() for c in line)
+        if letters >= 4 and line.isupper() and line[-1] not in ".,;:":
+            return 1, line
+        return None
+
+    def advance(self, text, base, upto):
+        """Read the lines of text (starting at absolute offset base) that begin at or before upto"""
+        pos = max(self.scanned - base, 0)
+        if 0 < pos <= len(text) and text[pos - 1] != "\n":
+            pos = text.find("\n", pos) + 1 or len(text) + 1
+        while pos <= upto - base and pos < len(text):
+            end = text.find("\n", pos)
+            heading = self._heading(text[pos:end if end != -1 else len(text)])
+            if heading:
+                level, title = heading
+                while self.stack and self.stack[-1][0] >= level:
+                    self.stack.pop()
+                self.stack.append((level, title))
+            if end == -1:
+                break
+            pos = end + 1
+        self.scanned = max(self.scanned, upto + 1)
+
+    def ignore(self, lines):
+        """Stop treating lines as headings (and drop them if already on the path)"""
+        self.ignored.update(lines)
+        self.stack = [(level, title) for level, title in self.stack if title not in self.ignored]
+
+    def path(self):
+        return [title for _, title in self.stack]
+
+
+def chunk_metadata(start, end, tracker):
+    """Offsets and heading path recorded on every chunk"""
+    metadata = {"start": start, "end": end}
+    headings = tracker.path()
+    if headings:
+        metadata["headings"] = headings
+    return metadata
+
+
+def locate_chunks(text, chunks, base, tracker, chunk_overlap=0):
+    """Yield (position in text, chunk, metadata) for consecutive chunks split from text"""
+    search_from = 0
+    for chunk in chunks:
+        position = text.find(chunk, search_from)
+        if position == -1:
+            position = search_from
+        # The next chunk overlaps this one by at most chunk_overlap characters
+        search_from = max(position + 1, position + len(chunk) - chunk_overlap)
+        tracker.advance(text, base, base + position)
+        yield position, chunk, chunk_metadata(base + position, base + position + len(chunk), tracker)
+
+
+def iter_text_chunks(file_path, chunk_size=1000, chunk_overlap=100, batch_size=CHUNK_BATCH_SIZE,
+                     block_chars=READ_BLOCK_CHARS):
+    """
+    Yield lists of chunk Documents while reading a text file block by block
+
+    Only one block plus the unfinished tail of the previous one is held in memory.
+    The last chunk of each block may have been cut at the block boundary, so it is
+    carried over and split again together with the next block.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    tracker = HeadingTracker()
+    batch = []
+    carry = ""
+    base = 0  # file offset of the first character of carry
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            block = f.read(block_chars)
+            text = carry + block
+            located = list(locate_chunks(text, splitter.split_text(text), base, tracker, chunk_overlap))
+            carry = ""
+            if block and located:
+                # Re-split the possibly incomplete last chunk with the next block
+                tail_start = located.pop()[0]
+                carry = text[tail_start:]
+                tracker.scanned = base + tail_start
+                base += tail_start
+            for _, chunk, metadata in located:
+                batch.append(Document(page_content=chunk, metadata=metadata))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if not block:
+                break
+    if batch:
+        yield batch
+
+
 def chunk_text(file_path, chunk_size=1000, chunk_overlap=100):
     """Chunk text file into smaller documents"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
+        documents = [doc for batch in iter_text_chunks(file_path, chunk_size, chunk_overlap) for doc in batch]
     except FileNotFoundError:
         print(f"❌ Error: File not found at {file_path}")
         print("Make sure to create a .txt file in data/study_materials/")
         return []
-    
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
-    )
-    chunks = splitter.split_text(text)
-    documents = [Document(page_content=chunk) for chunk in chunks]
-    
+
     print(f"✅ Split document into {len(documents)} chunks")
     return documents
@@ -0,0 +1,173 @@
+# utils/embedding_cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config.settings import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_DTYPE
+from utils.retrieval_cache import query_embedding_cache
+
+
+def text_key(text):
+    """SHA-256 digest of a chunk's text (raw 32 bytes)"""
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+class EmbeddingCache:
+    """
+    Persistent LRU cache of chunk embeddings for one model
+
+    Files in the cache directory:
+        vectors.bin  memory-mapped (capacity x dim) matrix, one row per slot
+        keys.bin     memory-mapped SHA-256 of the text stored in each slot
+        lru.npy      occupied slots, least recently used first
+        meta.json    model name, dim, dtype and capacity
+    """
+
+    def __init__(self, model_name, cache_dir=EMBEDDING_CACHE_PATH,
+                 max_entries=EMBEDDING_CACHE_MAX_ENTRIES, dtype=EMBEDDING_CACHE_DTYPE):
+        self.model_name = model_name
+        self.cache_dir = os.path.join(cache_dir, model_name.replace('/', '__'))
+        self.capacity = max_entries
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self.vectors = None
+        self.keys = None
+        self.slots = OrderedDict()  # key -> slot, LRU order
+        self._next_slot = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _load(self):
+        """Open an existing cache (lazily, on first use)"""
+        self._loaded = True
+        if not os.path.exists(self._path("meta.json")):
+            return
+        with open(self._path("meta.json"), 'r') as f:
+            meta = json.load(f)
+        if (meta["model"] != self.model_name or meta["dtype"] != self.dtype.name
+                or meta["capacity"] != self.capacity):
+            print(f"⚠️ Embedding cache settings changed, starting a new cache in {self.cache_dir}")
+            return
+        self._open(meta["dim"])
+        order = np.load(self._path("lru.npy")) if os.path.exists(self._path("lru.npy")) else []
+        for slot in order:
+            self.slots[bytes(self.keys[slot])] = int(slot)
+        self._next_slot = int(max(order) + 1) if len(order) else 0
+
+    def _open(self, dim, create=False):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        mode = 'w+' if create else 'r+'
+        self.dim = dim
+        self.vectors = np.memmap(self._path("vectors.bin"), dtype=self.dtype, mode=mode,
+                                 shape=(self.capacity, dim))
+        self.keys = np.memmap(self._path("keys.bin"), dtype='S32', mode=mode, shape=(self.capacity,))
+        if create:
+            with open(self._path("meta.json"), 'w') as f:
+                json.dump({"model": self.model_name, "dim": dim, "dtype": self.dtype.name,
+                           "capacity": self.capacity}, f, indent=2)
+
+    def get_many(self, texts):
+        """Return cached vectors for texts (None for misses)"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            results = []
+            for text in texts:
+                key = text_key(text)
+                slot = self.slots.get(key)
+                # keys.bin guards against a slot reused by another process
+                if slot is None or bytes(self.keys[slot]) != key:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self.slots.move_to_end(key)
+                self.hits += 1
+                results.append(np.asarray(self.vectors[slot], dtype=np.float32).tolist())
+            return results
+
+    def put_many(self, texts, vectors, flush=True):
+        """
+        Store vectors, evicting least recently used entries when full
+
+        flush=False leaves writing the LRU order (and syncing the memory maps) to a
+        later flush(), for callers storing many batches in a row.
+        """
+        if not texts:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if self.vectors is None:
+                self._open(len(vectors[0]), create=True)
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                slot = self.slots.pop(key, None)
+                if slot is None:
+                    if self._next_slot < self.capacity:
+                        slot = self._next_slot
+                        self._next_slot += 1
+                    else:
+                        _, slot = self.slots.popitem(last=False)
+                self.vectors[slot] = vector
+                self.keys[slot] = key
+                self.slots[key] = slot
+            if flush:
+                self._flush()
+
+    def flush(self):
+        """Persist vectors and LRU order stored with put_many(..., flush=False)"""
+        with self._lock:
+            if self.vectors is not None:
+                self._flush()
+
+    def _flush(self):
+        self.vectors.flush()
+        self.keys.flush()
+        tmp_path = self._path("lru.tmp.npy")
+        np.save(tmp_path, np.fromiter(self.slots.values(), dtype=np.int64, count=len(self.slots)))
+        os.replace(tmp_path, self._path("lru.npy"))
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        return {"entries": len(self.slots), "capacity": self.capacity,
+                "hits": self.hits, "misses": self.misses}
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends cache misses to the model"""
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        vectors = self.cache.get_many(texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            # Identical chunks inside one batch only need one model call
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            new_vectors = self.embeddings.embed_documents(unique_texts)
+            self.cache.put_many(unique_texts, new_vectors)
+            by_text = dict(zip(unique_texts, new_vectors))
+            for i in missing:
+                vectors[i] = list(by_text[texts[i]])
+        print(f"🧠 Embeddings: {len(texts) - len(missing)} cached, {len(missing)} computed")
+        return vectors
+
+    def embed_query(self, text):
+        key = (self.cache.model_name, text)
+        vector = query_embedding_cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            query_embedding_cache.put(key, vector)
+        return vector
@@ -0,0 +1,121 @@
+# utils/embedding_pipeline.py - batched, optionally multi-process chunk embedding
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from config.settings import EMBEDDING_BATCH_SIZE, EMBEDDING_WORKERS, EMBEDDING_PARALLEL_MIN_CHUNKS
+from utils.embeddings import get_embeddings, build_model
+
+_worker_model = None
+_pool = None          # (workers, ProcessPoolExecutor) kept for the life of the process
+_pool_lock = threading.Lock()
+
+
+def _init_worker(threads):
+    """Load one model copy per worker process"""
+    global _worker_model
+    _worker_model = build_model(threads=threads)
+
+
+def _embed_batch(texts):
+    return _worker_model.embed_documents(texts)
+
+
+def _get_pool(workers):
+    """
+    Worker pool with a model loaded in each process, started on first use and reused
+
+    Workers are spawned, not forked: the caller is a threaded process (Streamlit,
+    ingestion workers) that may already have torch initialised.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool[0] != workers:
+            if _pool is not None:
+                _pool[1].shutdown(wait=False)
+            threads = max(1, (os.cpu_count() or workers) // workers)
+            _pool = workers, ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                 initargs=(threads,),
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return _pool[1]
+
+
+def _discard_pool(pool):
+    """Forget a pool whose workers died, so the next call starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool[1] is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def embed_texts(texts, batch_size=None, workers=None, progress_callback=None):
+    """
+    Embed chunk texts, skipping anything already in the embedding cache
+
+    Args:
+        texts: Chunk texts
+        batch_size: Texts per model call (default EMBEDDING_BATCH_SIZE)
+        workers: Processes to shard cache misses over (default EMBEDDING_WORKERS)
+        progress_callback: Called as progress_callback(done, total, chunks_per_second)
+
+    Returns:
+        list: One vector per text, in input order
+    """
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    workers = workers or EMBEDDING_WORKERS
+    cached_embeddings = get_embeddings()
+    cache = cached_embeddings.cache
+    total = len(texts)
+    start = time.time()
+
+    vectors = cache.get_many(texts)
+    # Repeated chunk texts are embedded once
+    pending = Counter(texts[i] for i, v in enumerate(vectors) if v is None)
+    missing = list(pending)
+    done = total - sum(pending.values())
+    computed = {}
+
+    def report(batch_texts, batch_vectors):
+        nonlocal done
+        cache.put_many(batch_texts, batch_vectors, flush=False)
+        computed.update(zip(batch_texts, batch_vectors))
+        done += sum(pending[text] for text in batch_texts)
+        if progress_callback:
+            progress_callback(done, total, done / max(time.time() - start, 1e-6))
+
+    if progress_callback:
+        progress_callback(done, total, 0.0)
+
+    batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+    try:
+        if workers > 1 and len(missing) >= EMBEDDING_PARALLEL_MIN_CHUNKS:
+            print(f"⚡ Embedding {len(missing)} chunks with {workers} processes")
+            pool = _get_pool(workers)
+            try:
+                futures = {pool.submit(_embed_batch, batch): batch for batch in batches}
+                for future in as_completed(futures):
+                    report(futures[future], future.result())
+            except BrokenProcessPool:
+                _discard_pool(pool)
+                raise
+        else:
+            model = cached_embeddings.embeddings
+            for batch in batches:
+                report(batch, model.embed_documents(batch))
+    finally:
+        # Written once per call (also keeps the batches done before a failure)
+        if batches:
+            cache.flush()
+
+    for i, vector in enumerate(vectors):
+        if vector is None:
+            vectors[i] = list(computed[texts[i]])
+
+    elapsed = time.time() - start
+    print(f"🧠 Embedded {total} chunks ({total - len(missing)} cached) in {elapsed:.1f}s "
+          f"({total / max(elapsed, 1e-6):.0f} chunks/s)")
+    return vectors
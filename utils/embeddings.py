@@ -0,0 +1,59 @@
+# utils/embeddings.py - process-wide, lazily loaded embedding model
+import threading
+import time
+from langchain_core.embeddings import Embeddings
+from config.settings import EMBEDDING_MODEL, EMBEDDING_DEVICE, EMBEDDING_THREADS, EMBEDDING_BATCH_SIZE
+from utils.embedding_cache import EmbeddingCache, CachedEmbeddings
+
+_embeddings = None
+_lock = threading.Lock()
+
+
+def build_model(threads=EMBEDDING_THREADS, batch_size=EMBEDDING_BATCH_SIZE):
+    """Construct the raw (uncached) HuggingFace embedding model"""
+    # Imported here so that importing this module never loads torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={"device": EMBEDDING_DEVICE},
+        encode_kwargs={"batch_size": batch_size}
+    )
+
+
+def _build_embeddings():
+    return CachedEmbeddings(build_model(), EmbeddingCache(EMBEDDING_MODEL))
+
+
+def get_embeddings():
+    """Return the shared embedding model, loading it on first use"""
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                start = time.time()
+                _embeddings = _build_embeddings()
+                print(f"🧠 Loaded {EMBEDDING_MODEL} in {time.time() - start:.1f}s")
+    return _embeddings
+
+
+def is_embeddings_loaded():
+    return _embeddings is not None
+
+
+def warm_embeddings_async():
+    """Start loading the model in a background thread (no-op if already loaded)"""
+    if _embeddings is None:
+        threading.Thread(target=get_embeddings, name="embedding-warmup", daemon=True).start()
+
+
+class SharedEmbeddings(Embeddings):
+    """Cheap stand-in that forwards to the shared model once it is actually needed"""
+
+    def embed_documents(self, texts):
+        return get_embeddings().embed_documents(texts)
+
+    def embed_query(self, text):
+        return get_embeddings().embed_query(text)
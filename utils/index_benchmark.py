@@ -0,0 +1,98 @@
+# utils/index_benchmark.py - recall@k and memory of quantized indexes against exact float32 search
+import random
+import time
+import faiss
+import numpy as np
+from config.settings import VECTOR_DB_PATH, VECTOR_INDEX_TYPE
+from utils.embedding_pipeline import embed_texts
+from utils.vector_store import (
+    INDEX_BATCH_SIZE, VECTOR_DTYPES, build_index, load_vector_store, min_vectors_for, search_params,
+    stores_exact_vectors
+)
+
+QUERY_WORDS = 12  # queries are the opening words of sampled chunks
+FIRST_UPLOAD = 50  # vectors in the first upload of the incremental build
+
+
+def _corpus_vectors(vector_store):
+    """float32 vectors of every indexed chunk, in index position order"""
+    index = vector_store.index
+    if stores_exact_vectors(index):
+        return index.reconstruct_n(0, index.ntotal)
+    texts = [vector_store.docstore.search(vector_store.index_to_docstore_id[i]).page_content
+             for i in range(index.ntotal)]
+    return np.asarray(embed_texts(texts), dtype=np.float32)
+
+
+def _build_incrementally(vectors, index_type, dtype, first_upload=FIRST_UPLOAD):
+    """
+    Index vectors the way ingestion does: a small first upload, then batches added to it
+
+    The index is rebuilt (retrained) at the point ingestion would migrate it to the
+    requested type / dtype, so trained parts only see what was indexed by then.
+    """
+    index, built_type, built_dtype = build_index(vectors[:first_upload], index_type, dtype)
+    trained_on = first_upload
+    needed = min_vectors_for(index_type, dtype)
+    for start in range(first_upload, len(vectors), INDEX_BATCH_SIZE):
+        index.add(vectors[start:start + INDEX_BATCH_SIZE])
+        if index.ntotal >= needed and ((built_type, built_dtype) != (index_type, dtype) or trained_on < needed):
+            index, built_type, built_dtype = build_index(vectors[:index.ntotal], index_type, dtype)
+            trained_on = index.ntotal
+    return index, built_type, built_dtype
+
+
+def benchmark_vector_dtypes(db_path=VECTOR_DB_PATH, index_type=VECTOR_INDEX_TYPE, k=10, num_queries=200,
+                            dtypes=VECTOR_DTYPES, seed=0):
+    """
+    Compare vector dtypes on the indexed corpus
+
+    Each dtype gets an index_type index over the same vectors, built once over the
+    whole corpus ("full") and once the way uploads grow an index ("incremental").
+    Recall@k is measured against exact float32 search for queries made from the
+    opening words of randomly sampled chunks.
+
+    Returns:
+        list: One {"dtype", "build", "index_type", "stored", "bytes", "recall", "ms_per_query"}
+              row per dtype and build
+    """
+    vector_store = load_vector_store(db_path, mmap=False)
+    vectors = _corpus_vectors(vector_store)
+    rng = random.Random(seed)
+    sample = rng.sample(range(len(vectors)), min(num_queries, len(vectors)))
+    queries = [" ".join(vector_store.docstore.search(vector_store.index_to_docstore_id[i]).page_content
+                        .split()[:QUERY_WORDS]) for i in sample]
+    query_vectors = np.asarray(embed_texts(queries), dtype=np.float32)
+    k = min(k, len(vectors))
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(query_vectors, k)
+
+    rows = []
+    for dtype in dtypes:
+        for build in ("full", "incremental"):
+            if build == "full":
+                index, built_type, built_dtype = build_index(vectors, index_type, dtype)
+            else:
+                index, built_type, built_dtype = _build_incrementally(vectors, index_type, dtype)
+            start = time.perf_counter()
+            _, found = index.search(query_vectors, k, params=search_params(index))
+            elapsed = time.perf_counter() - start
+            recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+            rows.append({
+                "dtype": dtype,
+                "build": build,
+                "index_type": built_type,
+                "stored": built_dtype,
+                "bytes": len(faiss.serialize_index(index)),
+                "recall": round(float(recall), 4),
+                "ms_per_query": round(elapsed * 1000 / len(query_vectors), 3)
+            })
+
+    print(f"📏 {len(vectors)} vectors, {len(query_vectors)} queries, recall@{k} vs exact float32")
+    print(f"{'dtype':<8} {'build':<12} {'index':<9} {'stored':<8} {'size MB':>9} {'recall':>7} {'ms/query':>9}")
+    for row in rows:
+        print(f"{row['dtype']:<8} {row['build']:<12} {row['index_type']:<9} {row['stored']:<8} "
+              f"{row['bytes'] / 2**20:>9.1f} {row['recall']:>7.3f} {row['ms_per_query']:>9.3f}")
+    return rows
@@ -0,0 +1,76 @@
+# utils/index_registry.py - namespaced indexes, one per user and course
+import os
+import re
+from config.settings import VECTOR_DB_PATH, VECTOR_NAMESPACES_PATH
+from utils.vector_store import current_version, get_vector_store, load_manifest, open_vector_stores
+
+DEFAULT_COURSE = "general"
+
+
+def _slug(name):
+    """Directory-safe form of a user or course name"""
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name.strip()).strip("._") or "_"
+
+
+def namespace_key(owner=None, course=None):
+    """Normalized (owner, course) identifying a namespace ((None, None) = shared index)"""
+    if owner is None:
+        return None, None
+    return owner, _slug(course or DEFAULT_COURSE)
+
+
+def namespace_path(owner=None, course=None, root=VECTOR_NAMESPACES_PATH):
+    """
+    Index directory of a namespace
+
+    Each (owner, course) pair gets its own index under root/<owner>/<course>;
+    owner None is the shared index at VECTOR_DB_PATH.
+    """
+    if owner is None:
+        return VECTOR_DB_PATH
+    return os.path.join(root, _slug(owner), _slug(course or DEFAULT_COURSE))
+
+
+def list_namespaces(owner=None, root=VECTOR_NAMESPACES_PATH):
+    """
+    Indexes that have something published, optionally only one user's
+
+    Returns:
+        list: [{"owner", "course", "path", "version", "documents", "open"}], shared index first
+    """
+    loaded = set(open_vector_stores())
+    candidates = [(None, None, VECTOR_DB_PATH)] if owner is None else []
+    owners = [(owner, _slug(owner))] if owner is not None else \
+        [(name, name) for name in sorted(os.listdir(root))] if os.path.isdir(root) else []
+    for owner_name, owner_dir in owners:
+        owner_path = os.path.join(root, owner_dir)
+        if os.path.isdir(owner_path):
+            candidates.extend((owner_name, course, os.path.join(owner_path, course))
+                              for course in sorted(os.listdir(owner_path)))
+
+    namespaces = []
+    for owner_name, course, path in candidates:
+        version = current_version(path) if os.path.isdir(path) else None
+        if version is None:
+            continue
+        files = load_manifest(path)["files"]
+        namespaces.append({
+            "owner": owner_name,
+            "course": course,
+            "path": path,
+            "version": version,
+            "documents": sum(1 for entry in files.values() if not entry.get("alias_of")),
+            "open": os.path.abspath(path) in loaded
+        })
+    return namespaces
+
+
+def open_namespace(owner=None, course=None):
+    """
+    Read-only store of a namespace, loaded on first use (None if it has no index yet)
+
+    Loaded stores are shared by every session and at most OPEN_INDEXES_MAX stay
+    open (see get_vector_store); sessions should re-open their namespace on each
+    run rather than keep a store, so idle indexes can be released.
+    """
+    return get_vector_store(namespace_path(owner, course))
@@ -0,0 +1,388 @@
+# utils/ingestion.py - background ingestion jobs (extract -> embed -> index)
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from datetime import datetime
+from langchain_core.documents import Document
+from config.settings import (
+    CHUNK_SIZE, CHUNK_OVERLAP, USER_DATA_PATH, VECTOR_DB_PATH, INGESTION_WORKERS,
+    STUDY_MATERIALS_PATH, BULK_INGEST_WORKERS, BULK_INGEST_COMMIT_EVERY
+)
+from utils.document_processor import chunk_text, iter_text_chunks
+from utils.pdf_processor import iter_pdf_chunks
+from utils.embeddings import get_embeddings
+from utils.embedding_pipeline import embed_texts
+from utils.vector_store import (
+    INDEX_BATCH_SIZE, create_vector_store, add_files_to_vector_store, file_hash, is_file_indexed, tag_file
+)
+
+JOB_STATES = ("queued", "extracting", "embedding", "indexing", "done", "failed")
+ACTIVE_STATES = ("queued", "extracting", "embedding", "indexing")
+STUDY_FILE_EXTENSIONS = (".pdf", ".txt")
+
+
+def iter_file_chunks(file_path, page_log=None):
+    """Yield chunks for a PDF or text file"""
+    if file_path.lower().endswith(".pdf"):
+        return iter_pdf_chunks(file_path, CHUNK_SIZE, CHUNK_OVERLAP, page_log=page_log)
+    return (doc for batch in iter_text_chunks(file_path, CHUNK_SIZE, CHUNK_OVERLAP) for doc in batch)
+
+
+def write_chunks(path, documents):
+    """Stream chunks to a JSONL file (written atomically); returns the number written"""
+    count = 0
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        for doc in documents:
+            f.write(json.dumps({"text": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(path + ".tmp", path)
+    return count
+
+
+def read_chunks(path):
+    """Yield the chunks saved by write_chunks"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            yield Document(page_content=record["text"], metadata=record["metadata"])
+
+
+def ingest_file(file_path, db_path=VECTOR_DB_PATH, on_update=None, checkpoint_path=None, resume=False,
+                tags=None):
+    """
+    Chunk, embed and index one file
+
+    Chunks are spooled to a JSONL checkpoint instead of being kept in memory, and
+    embedding and indexing stream over it in batches, so memory stays bounded
+    however large the file is.
+
+    Args:
+        file_path: PDF or TXT file
+        db_path: Index directory
+        on_update: Called with a dict of changed job fields as work progresses
+        checkpoint_path: Where to spool the chunks (default: a temporary file)
+        resume: Reuse the chunks already in checkpoint_path instead of extracting again
+        tags: {"owner": ..., "course": ...} recorded for scoped search
+
+    Returns:
+        FAISS vector store
+    """
+    on_update = on_update or (lambda fields: None)
+    temporary = checkpoint_path is None
+    if temporary:
+        fd, checkpoint_path = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+    try:
+        if resume and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'rb') as f:
+                total = sum(1 for _ in f)
+            print(f"⏯️ Resuming {os.path.basename(file_path)} from checkpoint ({total} chunks)")
+        else:
+            on_update({"status": "extracting"})
+            page_log = []
+
+            def reporting(documents):
+                for count, doc in enumerate(documents, 1):
+                    if count % 50 == 0:
+                        on_update({"pages_done": len(page_log), "chunks_total": count})
+                    yield doc
+
+            total = write_chunks(checkpoint_path, reporting(iter_file_chunks(file_path, page_log)))
+            on_update({"pages_done": len(page_log), "chunks_total": total})
+
+        on_update({"status": "embedding", "chunks_total": total, "chunks_embedded": 0})
+        # Fills the embedding cache outside the index lock, so concurrent jobs embed in parallel
+        chunks = read_chunks(checkpoint_path)
+        done = 0
+        start = time.time()
+        while batch := list(islice(chunks, INDEX_BATCH_SIZE)):
+            embed_texts([doc.page_content for doc in batch],
+                        progress_callback=lambda batch_done, _total, _rate: on_update({
+                            "chunks_embedded": done + batch_done,
+                            "chunks_per_second": round((done + batch_done) / max(time.time() - start, 1e-6), 1)}))
+            done += len(batch)
+
+        on_update({"status": "indexing"})
+        return create_vector_store(read_chunks(checkpoint_path), source_path=file_path, db_path=db_path,
+                                   tags=tags)
+    finally:
+        if temporary and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+
+# ============================================================================
+# BULK INGESTION
+# ============================================================================
+def find_study_files(root=STUDY_MATERIALS_PATH):
+    """All PDF and TXT files under root, in a stable order"""
+    found = []
+    for directory, _, names in os.walk(root):
+        found.extend(os.path.join(directory, name) for name in names
+                     if name.lower().endswith(STUDY_FILE_EXTENSIONS))
+    return sorted(found)
+
+
+def _extract_file(file_path):
+    """Chunk one file in a worker process: (file_path, documents, pages, error)"""
+    try:
+        if file_path.lower().endswith(".pdf"):
+            page_log = []
+            # One process per file already; don't start a nested page pool
+            documents = list(iter_pdf_chunks(file_path, CHUNK_SIZE, CHUNK_OVERLAP,
+                                             workers=1, page_log=page_log))
+            return file_path, documents, len(page_log), None
+        return file_path, chunk_text(file_path, CHUNK_SIZE, CHUNK_OVERLAP), 0, None
+    except Exception as e:
+        return file_path, None, 0, str(e)
+
+
+def ingest_directory(root=STUDY_MATERIALS_PATH, db_path=VECTOR_DB_PATH, workers=None,
+                     commit_every=None, tags=None):
+    """
+    Index every study file under root into one consolidated index
+
+    Files are extracted in parallel processes while the previous batch is embedded.
+    The index and manifest are committed every commit_every files, so rerunning after
+    an interruption skips everything that was already committed.
+
+    Args:
+        root: Directory to walk
+        db_path: Index directory
+        workers: Extraction processes (default BULK_INGEST_WORKERS, 0 = one per CPU)
+        commit_every: Files per index commit (default BULK_INGEST_COMMIT_EVERY)
+        tags: {"owner": ..., "course": ...} recorded on every file
+
+    Returns:
+        dict: Throughput stats for the run
+    """
+    workers = workers or BULK_INGEST_WORKERS or os.cpu_count() or 1
+    commit_every = commit_every or BULK_INGEST_COMMIT_EVERY
+    files = find_study_files(root)
+    pending = [path for path in files if not is_file_indexed(path, db_path)]
+    print(f"📚 {len(files)} files under {root}: {len(files) - len(pending)} already indexed, "
+          f"{len(pending)} to ingest")
+
+    stats = {"files": 0, "pages": 0, "chunks": 0, "embeddings": 0,
+             "embed_seconds": 0.0, "seconds": 0.0, "failed": []}
+    if not pending:
+        return stats
+    cache = get_embeddings().cache
+    start = time.time()
+
+    def commit(batch):
+        texts = [doc.page_content for _, documents in batch for doc in documents]
+        embed_start, misses_before = time.time(), cache.misses
+        embed_texts(texts)
+        stats["embed_seconds"] += time.time() - embed_start
+        stats["embeddings"] += cache.misses - misses_before
+        add_files_to_vector_store(batch, db_path, tags=tags)
+        stats["files"] += len(batch)
+        stats["chunks"] += len(texts)
+        stats["seconds"] = time.time() - start
+        print(f"💾 Committed {stats['files']}/{len(pending)} files - {throughput_summary(stats)}")
+
+    remaining = iter(pending)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep a bounded window of files in flight so chunks never pile up in memory
+        in_flight = deque(pool.submit(_extract_file, path)
+                          for path in islice(remaining, commit_every + workers))
+        batch = []
+        while in_flight:
+            file_path, documents, pages, error = in_flight.popleft().result()
+            next_path = next(remaining, None)
+            if next_path:
+                in_flight.append(pool.submit(_extract_file, next_path))
+            if error:
+                print(f"❌ Skipping {file_path}: {error}")
+                stats["failed"].append(file_path)
+                continue
+            stats["pages"] += pages
+            batch.append((file_path, documents))
+            if len(batch) >= commit_every:
+                commit(batch)
+                batch = []
+        if batch:
+            commit(batch)
+
+    stats["seconds"] = time.time() - start
+    print(f"✅ Bulk ingestion finished - {throughput_summary(stats)}")
+    if stats["failed"]:
+        print(f"⚠️ {len(stats['failed'])} files failed and will be retried on the next run")
+    return stats
+
+
+def throughput_summary(stats):
+    seconds = max(stats["seconds"], 1e-6)
+    return (f"{stats['files'] / seconds:.2f} files/s, {stats['pages'] / seconds:.1f} pages/s, "
+            f"{stats['chunks'] / seconds:.1f} chunks/s, "
+            f"{stats['embeddings'] / max(stats['embed_seconds'], 1e-6):.1f} embeddings/s "
+            f"({stats['embeddings']} computed)")
+
+
+class IngestionQueue:
+    """
+    Worker pool running ingestion jobs outside the Streamlit script run
+
+    Jobs are persisted in data/user_data/ingestion_jobs.json. Extracted chunks are
+    checkpointed, so a job interrupted after extraction resumes at embedding
+    (and already-embedded batches come straight from the embedding cache).
+    """
+
+    def __init__(self, workers=INGESTION_WORKERS, data_dir=USER_DATA_PATH, db_path=VECTOR_DB_PATH):
+        self.jobs_file = os.path.join(data_dir, "ingestion_jobs.json")
+        self.checkpoint_dir = os.path.join(data_dir, "ingestion_checkpoints")
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self.jobs = self._load_jobs()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingestion")
+        # Resume anything that was running when the process stopped
+        for job in self.jobs.values():
+            if job["status"] in ACTIVE_STATES:
+                self.pool.submit(self._run, job["id"])
+
+    # === Job table ===
+
+    def _load_jobs(self):
+        if os.path.exists(self.jobs_file):
+            with open(self.jobs_file, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def _save_jobs(self):
+        os.makedirs(os.path.dirname(self.jobs_file), exist_ok=True)
+        tmp_path = self.jobs_file + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.jobs, f, indent=2)
+        os.replace(tmp_path, self.jobs_file)
+        self._last_save = time.time()
+
+    def _update(self, job_id, fields):
+        with self._lock:
+            job = self.jobs[job_id]
+            state_change = "status" in fields and fields["status"] != job["status"]
+            job.update(fields)
+            job["updated_at"] = datetime.now().isoformat()
+            # Progress counters are saved at most twice a second; state changes always
+            if state_change or time.time() - self._last_save > 0.5:
+                self._save_jobs()
+
+    def enqueue(self, file_path, owner=None, course=None, db_path=None):
+        """
+        Queue a file for ingestion (returns the existing job if it is already queued/running)
+
+        db_path selects the index to add it to (default: the queue's index). The file's
+        content hash is recorded, so the job fails instead of indexing another upload
+        that replaced the file in the meantime.
+        """
+        db_path = db_path or self.db_path
+        content_hash = file_hash(file_path)
+        with self._lock:
+            for job in self.jobs.values():
+                if job["file_path"] == file_path and job.get("db_path", self.db_path) == db_path \
+                        and job.get("hash") == content_hash and job["status"] in ACTIVE_STATES:
+                    return dict(job)
+            job = {
+                "id": str(uuid.uuid4()),
+                "file_path": file_path,
+                "file_name": os.path.basename(file_path),
+                "owner": owner,
+                "course": course,
+                "db_path": db_path,
+                "hash": content_hash,
+                "status": "queued",
+                "pages_done": 0,
+                "chunks_total": 0,
+                "chunks_embedded": 0,
+                "chunks_per_second": 0.0,
+                "error": None,
+                "created_at": datetime.now().isoformat(),
+                "updated_at": datetime.now().isoformat()
+            }
+            self.jobs[job["id"]] = job
+            self._save_jobs()
+        self.pool.submit(self._run, job["id"])
+        print(f"📥 Queued ingestion of {job['file_name']}")
+        return dict(job)
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self, owner=None):
+        """Jobs newest first, optionally only one user's"""
+        with self._lock:
+            jobs = [dict(job) for job in self.jobs.values() if owner is None or job["owner"] == owner]
+        return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+    def _checkpoint_path(self, job_id):
+        return os.path.join(self.checkpoint_dir, f"{job_id}.jsonl")
+
+    # === Worker ===
+
+    def _run(self, job_id):
+        job = self.get_job(job_id)
+        tags = {"owner": job["owner"], "course": job.get("course")}
+        db_path = job.get("db_path", self.db_path)
+        try:
+            if job.get("hash") and file_hash(job["file_path"]) != job["hash"]:
+                raise RuntimeError("The file was replaced by another upload before it was processed, "
+                                   "please upload it again")
+            if is_file_indexed(job["file_path"], db_path):
+                # Re-uploading the same file can still move it to another course
+                tag_file(job["file_path"], tags, db_path)
+                self._update(job_id, {"status": "done", "skipped": True})
+                return
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            ingest_file(job["file_path"], db_path,
+                        on_update=lambda fields: self._update(job_id, fields),
+                        checkpoint_path=self._checkpoint_path(job_id),
+                        resume=job["status"] in ("embedding", "indexing"),
+                        tags=tags)
+            self._update(job_id, {"status": "done", "finished_at": datetime.now().isoformat()})
+            if os.path.exists(self._checkpoint_path(job_id)):
+                os.remove(self._checkpoint_path(job_id))
+            print(f"✅ Ingestion finished: {job['file_name']}")
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, {"status": "failed", "error": str(e)})
+            print(f"❌ Ingestion failed for {job['file_name']}: {e}")
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_ingestion_queue():
+    """Process-wide ingestion queue shared by all Streamlit sessions"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = IngestionQueue()
+        return _queue
+
+
+def job_progress(job):
+    """Overall fraction done (0-1) and a short label for a job"""
+    status = job["status"]
+    if status == "done":
+        return 1.0, "Done" + (" (already indexed)" if job.get("skipped") else "")
+    if status == "failed":
+        return 1.0, f"Failed: {job['error']}"
+    if status == "extracting":
+        return 0.05, f"Extracting... {job['pages_done']} pages, {job['chunks_total']} chunks"
+    if status == "embedding":
+        done = job["chunks_embedded"] / max(job["chunks_total"], 1)
+        return 0.1 + 0.8 * done, (f"Embeddings... {job['chunks_embedded']}/{job['chunks_total']} "
+                                  f"({job['chunks_per_second']:.0f} chunks/s)")
+    if status == "indexing":
+        return 0.95, "Indexing..."
+    return 0.0, "Queued"
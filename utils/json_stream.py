@@ -0,0 +1,71 @@
+# utils/json_stream.py - pick complete items out of JSON that is still being generated
+import json
+
+
+class JsonArrayStream:
+    """
+    Incremental parser for the elements of one top-level array in streamed JSON
+
+    feed() takes the next piece of LLM output and returns the objects of
+    "key": [...] that became complete with it, so a UI can show each one before
+    the rest of the response has arrived. Text around the JSON (markdown fences,
+    remarks) is ignored; only nesting and strings are tracked.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.buffer = ""
+        self.pos = 0            # next character of buffer to scan
+        self.depth = 0          # open {/[ outside strings
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None  # (text, depth) of the last complete string
+        self.array_depth = None  # depth inside the target array, while in it
+        self.item_start = None
+        self.done = False
+
+    def feed(self, text):
+        """Add streamed text; return the newly completed array items"""
+        self.buffer += text
+        items = []
+        while self.pos < len(self.buffer) and not self.done:
+            char = self.buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    try:
+                        self.last_string = (json.loads(self.buffer[self.string_start:self.pos + 1]), self.depth)
+                    except ValueError:
+                        self.last_string = None
+            elif char == '"':
+                self.in_string = True
+                self.string_start = self.pos
+            elif char in "{[":
+                if char == "[" and self.array_depth is None and self.depth == 1 \
+                        and self.last_string == (self.key, 1):
+                    self.array_depth = self.depth + 1
+                elif char == "{" and self.array_depth is not None and self.depth == self.array_depth:
+                    self.item_start = self.pos
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.array_depth is not None:
+                    if char == "}" and self.depth == self.array_depth and self.item_start is not None:
+                        try:
+                            items.append(json.loads(self.buffer[self.item_start:self.pos + 1]))
+                        except ValueError:
+                            pass
+                        self.item_start = None
+                    elif char == "]" and self.depth == self.array_depth - 1:
+                        self.done = True
+            self.pos += 1
+        if self.item_start is None and not self.in_string:
+            # Everything before pos has been handled
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        return items
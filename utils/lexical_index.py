@@ -0,0 +1,124 @@
+# utils/lexical_index.py - BM25 inverted index built alongside the FAISS index
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+LEXICAL_FILE = "lexical.json"
+
+# Keeps course codes (brmk557), dotted/hyphenated names (t-test, 2.3) as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class LexicalIndex:
+    """
+    Compact BM25 index over chunk ids
+
+    Chunks are numbered internally; each term keeps a flat [doc, tf, doc, tf, ...]
+    postings list. Removed chunks are blanked and skipped at query time.
+    """
+
+    def __init__(self):
+        self.doc_ids = []       # internal number -> chunk id (None once removed)
+        self.doc_lengths = []
+        self.postings = defaultdict(list)
+        self._numbers = {}      # chunk id -> internal number
+        self._live = 0
+        self._total_length = 0
+
+    def add(self, chunk_ids, texts):
+        for chunk_id, text in zip(chunk_ids, texts):
+            number = len(self.doc_ids)
+            terms = Counter(tokenize(text))
+            self.doc_ids.append(chunk_id)
+            self.doc_lengths.append(sum(terms.values()))
+            self._numbers[chunk_id] = number
+            self._live += 1
+            self._total_length += self.doc_lengths[-1]
+            for term, tf in terms.items():
+                self.postings[term].extend((number, tf))
+
+    def remove(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            number = self._numbers.pop(chunk_id, None)
+            if number is not None:
+                self.doc_ids[number] = None
+                self._live -= 1
+                self._total_length -= self.doc_lengths[number]
+
+    def search(self, query, k=3, allowed_ids=None):
+        """Return [(chunk_id, bm25 score)] best first"""
+        if not self._live:
+            return []
+        avg_length = self._total_length / self._live
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings) // 2
+            idf = math.log(1 + (self._live - df + 0.5) / (df + 0.5))
+            for i in range(0, len(postings), 2):
+                number, tf = postings[i], postings[i + 1]
+                chunk_id = self.doc_ids[number]
+                if chunk_id is None or (allowed_ids is not None and chunk_id not in allowed_ids):
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[number] / avg_length)
+                scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def save(self, path):
+        """Write lexical.json into the index directory"""
+        # Drop removed chunks so the file only grows with the live corpus
+        keep = [n for n, chunk_id in enumerate(self.doc_ids) if chunk_id is not None]
+        renumber = {old: new for new, old in enumerate(keep)}
+        postings = {}
+        for term, entries in self.postings.items():
+            compact = []
+            for i in range(0, len(entries), 2):
+                if entries[i] in renumber:
+                    compact.extend((renumber[entries[i]], entries[i + 1]))
+            if compact:
+                postings[term] = compact
+        data = {
+            "doc_ids": [self.doc_ids[n] for n in keep],
+            "doc_lengths": [self.doc_lengths[n] for n in keep],
+            "postings": postings
+        }
+        file_path = os.path.join(path, LEXICAL_FILE)
+        with open(file_path + ".tmp", 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(file_path + ".tmp", file_path)
+
+    @classmethod
+    def load(cls, path):
+        """Load lexical.json from an index directory (None if it has not been built)"""
+        file_path = os.path.join(path, LEXICAL_FILE)
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        index = cls()
+        index.doc_ids = data["doc_ids"]
+        index.doc_lengths = data["doc_lengths"]
+        index.postings = defaultdict(list, data["postings"])
+        index._numbers = {chunk_id: n for n, chunk_id in enumerate(index.doc_ids)}
+        index._live = len(index.doc_ids)
+        index._total_length = sum(index.doc_lengths)
+        return index
+
+    @classmethod
+    def build(cls, chunk_ids, docstore):
+        """Index existing chunks (used for stores created before lexical.json existed)"""
+        index = cls()
+        chunk_ids = list(chunk_ids)
+        index.add(chunk_ids, [docstore.search(chunk_id).page_content for chunk_id in chunk_ids])
+        return index
@@ -0,0 +1,228 @@
+# utils/llm_cache.py - persistent LLM response cache shared by all agents
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from langchain_core.messages import AIMessage, AIMessageChunk
+from config.settings import (
+    LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_AGENTS
+)
+
+
+def normalize_text(text):
+    """Collapse whitespace so prompts differing only in indentation share an entry"""
+    return " ".join(str(text).split())
+
+
+def response_key(model, temperature, messages):
+    """SHA-256 of (model, temperature, normalized messages)"""
+    payload = json.dumps({
+        "model": model,
+        "temperature": temperature,
+        "messages": [[message.type, normalize_text(message.content)] for message in messages]
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk LRU cache of LLM responses for one agent
+
+    Entries live in a SQLite file shared by every agent and process (one table,
+    rows tagged with the agent name). Each agent has its own TTL and entry limit;
+    the least recently used entries beyond the limit are evicted on write.
+    """
+
+    def __init__(self, agent, ttl=None, max_entries=None, path=LLM_CACHE_PATH):
+        settings = LLM_CACHE_AGENTS.get(agent, {})
+        self.agent = agent
+        self.ttl = settings.get("ttl", LLM_CACHE_TTL_SECONDS) if ttl is None else ttl
+        self.max_entries = settings.get("max_entries", LLM_CACHE_MAX_ENTRIES) if max_entries is None \
+            else max_entries
+        self.path = path
+        self._lock = threading.Lock()
+        self._ready = False
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0  # generation time the hits would have cost
+
+    @contextmanager
+    def _transaction(self):
+        """Connection for one locked transaction (committed on success, always closed)"""
+        with self._lock:
+            if not self._ready:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            try:
+                with connection:
+                    if not self._ready:
+                        self._create(connection)
+                    yield connection
+            finally:
+                connection.close()
+
+    def _create(self, connection):
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+            agent TEXT, key TEXT, content TEXT, latency REAL, created REAL, accessed REAL,
+            PRIMARY KEY (agent, key))""")
+        connection.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (agent, accessed)")
+        self._ready = True
+
+    def get(self, key):
+        """Cached response text (None on a miss or an expired entry)"""
+        if not self.ttl:
+            return None
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute("SELECT content, latency, created FROM responses WHERE agent = ? AND key = ?",
+                                     (self.agent, key)).fetchone()
+            if row is None or now - row[2] > self.ttl:
+                if row is not None:
+                    connection.execute("DELETE FROM responses WHERE agent = ? AND key = ?", (self.agent, key))
+                self.misses += 1
+                return None
+            connection.execute("UPDATE responses SET accessed = ? WHERE agent = ? AND key = ?",
+                               (now, self.agent, key))
+            self.hits += 1
+            self.saved_seconds += row[1]
+            return row[0]
+
+    def put(self, key, content, latency):
+        """Store a response, then drop expired and least recently used entries of this agent"""
+        if not self.ttl:
+            return
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                               (self.agent, key, content, latency, now, now))
+            connection.execute("DELETE FROM responses WHERE agent = ? AND created < ?",
+                               (self.agent, now - self.ttl))
+            connection.execute("""DELETE FROM responses WHERE agent = ? AND key IN (
+                SELECT key FROM responses WHERE agent = ? ORDER BY accessed DESC LIMIT -1 OFFSET ?)""",
+                               (self.agent, self.agent, self.max_entries))
+
+    def discard(self, key):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM responses WHERE agent = ? AND key = ?", (self.agent, key))
+
+    def clear(self):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM responses WHERE agent = ?", (self.agent,))
+
+    def stats(self):
+        """Hit/miss counters and saved generation time for this process"""
+        lookups = self.hits + self.misses
+        return {
+            "agent": self.agent,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 1)
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(agent):
+    """Process-wide ResponseCache of an agent (so stats add up across sessions)"""
+    with _caches_lock:
+        if agent not in _caches:
+            _caches[agent] = ResponseCache(agent)
+        return _caches[agent]
+
+
+def get_llm_cache_stats():
+    with _caches_lock:
+        return {agent: cache.stats() for agent, cache in _caches.items()}
+
+
+class CachedLLM:
+    """
+    Chat model wrapper answering repeated prompts from the response cache
+
+    invoke(), ainvoke()/abatch() and stream() are served from the cache when (model, temperature,
+    messages) was seen before; everything else is passed through to the wrapped model.
+    """
+
+    def __init__(self, llm, agent, enabled=LLM_CACHE_ENABLED):
+        self.llm = llm
+        self.cache = get_response_cache(agent) if enabled else None
+
+    @property
+    def model(self):
+        return getattr(self.llm, "model_name", None) or getattr(self.llm, "model", None)
+
+    def cache_key(self, messages):
+        return response_key(self.model, getattr(self.llm, "temperature", None), messages)
+
+    def invoke(self, messages, **kwargs):
+        if self.cache is None or kwargs:
+            return self.llm.invoke(messages, **kwargs)
+        key = self.cache_key(messages)
+        content = self.cache.get(key)
+        if content is not None:
+            print(f"💾 LLM cache hit ({self.cache.agent})")
+            return AIMessage(content=content)
+        start = time.time()
+        response = self.llm.invoke(messages)
+        self.cache.put(key, response.content, time.time() - start)
+        return response
+
+    async def ainvoke(self, messages, **kwargs):
+        if self.cache is None or kwargs:
+            return await self.llm.ainvoke(messages, **kwargs)
+        key = self.cache_key(messages)
+        content = self.cache.get(key)
+        if content is not None:
+            print(f"💾 LLM cache hit ({self.cache.agent})")
+            return AIMessage(content=content)
+        start = time.time()
+        response = await self.llm.ainvoke(messages)
+        self.cache.put(key, response.content, time.time() - start)
+        return response
+
+    async def abatch(self, inputs, return_exceptions=False):
+        """
+        Responses to several prompts, generated concurrently (cached ones are not sent)
+
+        With return_exceptions=True a failed request gives its exception in place of a
+        response instead of raising, so the other responses are kept.
+        """
+        return await asyncio.gather(*(self.ainvoke(messages) for messages in inputs),
+                                    return_exceptions=return_exceptions)
+
+    def stream(self, messages, **kwargs):
+        """Yield response chunks as they arrive; a cached response comes back as one chunk"""
+        if self.cache is None or kwargs:
+            yield from self.llm.stream(messages, **kwargs)
+            return
+        key = self.cache_key(messages)
+        content = self.cache.get(key)
+        if content is not None:
+            print(f"💾 LLM cache hit ({self.cache.agent})")
+            yield AIMessageChunk(content=content)
+            return
+        start = time.time()
+        parts = []
+        for chunk in self.llm.stream(messages):
+            parts.append(chunk.content)
+            yield chunk
+        # Only complete responses are cached
+        self.cache.put(key, "".join(parts), time.time() - start)
+
+    def forget(self, messages):
+        """Drop the cached response to messages (e.g. when it could not be parsed)"""
+        if self.cache is not None:
+            self.cache.discard(self.cache_key(messages))
+
+    def __getattr__(self, name):
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
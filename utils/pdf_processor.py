@@ -1,33 +1,270 @@
 # utils/pdf_processor.py
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import pdfplumber
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from utils.document_processor import HeadingTracker, locate_chunks
+from config.settings import (
+    PDF_EXTRACT_WORKERS, PDF_PAGES_PER_TASK, PDF_PARALLEL_MIN_PAGES,
+    PDF_FAST_ENGINE, PDF_GARBLED_THRESHOLD
+)
 
-def extract_text_from_pdf(pdf_path):
+
+# ============================================================================
+# EXTRACTION ENGINES
+# ============================================================================
+class PdfplumberEngine:
+    """Accurate layout-aware extraction (slow)"""
+    name = "pdfplumber"
+
+    def __init__(self, pdf_path):
+        self.pdf = pdfplumber.open(pdf_path)
+
+    def page_count(self):
+        return len(self.pdf.pages)
+
+    def extract(self, number):
+        page = self.pdf.pages[number]
+        text = page.extract_text() or ""
+        page.close()  # drop pdfplumber's per-page object cache
+        return text
+
+    def close(self):
+        self.pdf.close()
+
+
+# PDFium is not thread-safe: every call into it, for any document, holds this lock
+# (ingestion worker threads may extract small PDFs in-process at the same time)
+_pdfium_lock = threading.Lock()
+
+
+class PdfiumEngine:
+    """Reads the PDF text layer directly via pypdfium2 (fast)"""
+    name = "pdfium"
+
+    def __init__(self, pdf_path):
+        import pypdfium2
+        with _pdfium_lock:
+            self.pdf = pypdfium2.PdfDocument(pdf_path)
+
+    def page_count(self):
+        with _pdfium_lock:
+            return len(self.pdf)
+
+    def extract(self, number):
+        with _pdfium_lock:
+            page = self.pdf[number]
+            textpage = page.get_textpage()
+            text = textpage.get_text_range()
+            textpage.close()
+            page.close()
+        return text.replace("\r\n", "\n")
+
+    def close(self):
+        with _pdfium_lock:
+            self.pdf.close()
+
+
+class PypdfEngine:
+    """Pure-Python text layer extraction via pypdf"""
+    name = "pypdf"
+
+    def __init__(self, pdf_path):
+        from pypdf import PdfReader
+        self.reader = PdfReader(pdf_path)
+
+    def page_count(self):
+        return len(self.reader.pages)
+
+    def extract(self, number):
+        return self.reader.pages[number].extract_text() or ""
+
+    def close(self):
+        pass
+
+
+EXTRACTION_ENGINES = {
+    "pdfium": PdfiumEngine,
+    "pypdf": PypdfEngine,
+    "pdfplumber": PdfplumberEngine,
+}
+
+FALLBACK_ENGINE = "pdfplumber"
+
+
+def looks_garbled(text):
+    """True if a fast-path page is empty or mostly unusable characters"""
+    stripped = "".join(text.split())
+    if not stripped:
+        return True
+    bad = len(re.findall(r"\(cid:\d+\)", text)) * 6
+    letters = 0
+    for char in stripped:
+        category = unicodedata.category(char)
+        if char == "�" or category in ("Cc", "Cn", "Cs"):
+            bad += 1
+        elif category[0] in "LN":
+            letters += 1
+    return bad / len(stripped) > PDF_GARBLED_THRESHOLD or letters / len(stripped) < 0.3
+
+
+class PageExtractor:
+    """Tries the fast engine per page and falls back to pdfplumber when needed"""
+
+    def __init__(self, pdf_path, engine=None):
+        self.pdf_path = pdf_path
+        engine = engine or PDF_FAST_ENGINE
+        try:
+            self.primary = EXTRACTION_ENGINES[engine](pdf_path)
+        except ImportError:
+            print(f"⚠️ PDF engine '{engine}' not installed, using {FALLBACK_ENGINE}")
+            self.primary = EXTRACTION_ENGINES[FALLBACK_ENGINE](pdf_path)
+        self.fallback = None
+
+    def page_count(self):
+        return self.primary.page_count()
+
+    def extract(self, number):
+        """Return {"page", "text", "engine", "seconds"} for a 0-based page number"""
+        start = time.perf_counter()
+        text = self.primary.extract(number)
+        engine = self.primary.name
+        if engine != FALLBACK_ENGINE and looks_garbled(text):
+            if self.fallback is None:
+                self.fallback = EXTRACTION_ENGINES[FALLBACK_ENGINE](self.pdf_path)
+            text = self.fallback.extract(number)
+            engine = FALLBACK_ENGINE
+        return {"page": number + 1, "text": text, "engine": engine,
+                "seconds": round(time.perf_counter() - start, 4)}
+
+    def close(self):
+        self.primary.close()
+        if self.fallback is not None:
+            self.fallback.close()
+
+
+def _extract_page_range(pdf_path, start, end, engine=None):
+    """Extract pages [start, end) - runs in a worker process in parallel mode"""
+    extractor = PageExtractor(pdf_path, engine)
+    try:
+        return [extractor.extract(number) for number in range(start, end)]
+    finally:
+        extractor.close()
+
+
+def _resolve_workers(workers, page_count):
+    if workers is None:
+        workers = PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+    if page_count < PDF_PARALLEL_MIN_PAGES:
+        return 1
+    return max(1, min(workers, -(-page_count // PDF_PAGES_PER_TASK)))
+
+
+def iter_pdf_pages(pdf_path, workers=None, engine=None):
+    """
+    Yield {"page", "text", "engine", "seconds"} for each page, in page order
+
+    Args:
+        pdf_path: PDF file
+        workers: Processes to spread page ranges over
+                 (None = PDF_EXTRACT_WORKERS, 1 = extract in this process)
+        engine: Fast-path engine name (default PDF_FAST_ENGINE)
+    """
+    extractor = PageExtractor(pdf_path, engine)
+    try:
+        page_count = extractor.page_count()
+        workers = _resolve_workers(workers, page_count)
+        if workers == 1:
+            for number in range(page_count):
+                yield extractor.extract(number)
+            return
+    finally:
+        extractor.close()
+
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, page_count))
+              for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    print(f"⚡ Extracting {page_count} pages with {workers} processes")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_extract_page_range, pdf_path, start, end, engine) for start, end in ranges]
+        for future in futures:
+            yield from future.result()
+
+
+def extraction_report(pages):
+    """Summarize per-page extraction records: pages per engine and total time"""
+    return {
+        "pages": len(pages),
+        "engines": dict(Counter(page["engine"] for page in pages)),
+        "seconds": round(sum(page["seconds"] for page in pages), 3),
+        "slowest_pages": sorted(pages, key=lambda p: p["seconds"], reverse=True)[:3]
+    }
+
+
+def _print_report(pages):
+    report = extraction_report(pages)
+    engines = ", ".join(f"{name}: {count}" for name, count in report["engines"].items())
+    print(f"📄 Extracted {report['pages']} pages in {report['seconds']}s ({engines})")
+
+
+def extract_text_from_pdf(pdf_path, workers=None):
     """Extract text from PDF file"""
-    text = ""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
+        pages = list(iter_pdf_pages(pdf_path, workers))
+        text = "".join(page["text"] + "\n" for page in pages)
+        _print_report(pages)
         print(f"✅ Extracted {len(text)} characters from PDF")
         return text
     except Exception as e:
         print(f"❌ Error extracting PDF: {e}")
         return None
 
-def chunk_pdf_text(pdf_path, chunk_size=1000, chunk_overlap=100):
-    """Extract and chunk PDF text"""
-    text = extract_text_from_pdf(pdf_path)
-    if not text:
-        return []
-    
+
+def iter_pdf_chunks(pdf_path, chunk_size=1000, chunk_overlap=100, workers=None, page_log=None):
+    """
+    Yield chunks page by page, so splitting starts before extraction finishes
+
+    Each chunk records its page, character offsets within the page text and the
+    heading path in effect. If page_log is a list, each page's extraction record
+    (without text) is appended to it.
+    """
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap
     )
-    chunks = splitter.split_text(text)
-    documents = [Document(page_content=chunk) for chunk in chunks]
-    
+    tracker = HeadingTracker()
+    base = 0  # headings are tracked over the concatenated pages
+    previous_lines = set()
+    for page in iter_pdf_pages(pdf_path, workers):
+        if page_log is not None:
+            page_log.append({key: value for key, value in page.items() if key != "text"})
+        # Short lines repeated on consecutive pages are running headers/footers, not sections
+        lines = {line.strip() for line in page["text"].split("\n") if 0 < len(line.strip()) <= 80}
+        tracker.ignore(lines & previous_lines)
+        previous_lines = lines
+        chunks = splitter.split_text(page["text"])
+        for _, chunk, metadata in locate_chunks(page["text"], chunks, base, tracker, chunk_overlap):
+            metadata["start"] -= base
+            metadata["end"] -= base
+            yield Document(page_content=chunk, metadata={"page": page["page"], **metadata})
+        tracker.advance(page["text"], base, base + len(page["text"]))
+        base += len(page["text"]) + 1
+
+
+def chunk_pdf_text(pdf_path, chunk_size=1000, chunk_overlap=100, workers=None):
+    """Extract and chunk PDF text"""
+    pages = []
+    try:
+        documents = list(iter_pdf_chunks(pdf_path, chunk_size, chunk_overlap, workers, page_log=pages))
+    except Exception as e:
+        print(f"❌ Error extracting PDF: {e}")
+        return []
+
+    _print_report(pages)
     print(f"✅ Split PDF into {len(documents)} chunks")
     return documents
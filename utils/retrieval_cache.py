@@ -0,0 +1,72 @@
+# utils/retrieval_cache.py - in-process LRU caches for the retrieval hot path
+import threading
+from collections import OrderedDict
+from config.settings import QUERY_EMBEDDING_CACHE_SIZE, SEARCH_RESULTS_CACHE_SIZE
+
+
+class LRUCache:
+    """Thread-safe LRU dict with hit/miss counters (shared by all sessions)"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard_where(self, predicate):
+        """Drop every entry whose key matches predicate"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+# query text -> embedding (independent of the index contents)
+query_embedding_cache = LRUCache(QUERY_EMBEDDING_CACHE_SIZE)
+# (index path, index version, search options, query) -> documents
+search_results_cache = LRUCache(SEARCH_RESULTS_CACHE_SIZE)
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+def invalidate_index(db_path):
+    """Forget cached results for an index after it has been re-ingested"""
+    search_results_cache.discard_where(lambda key: key[0] == db_path)
+
+
+def get_cache_stats():
+    return {
+        "query_embeddings": query_embedding_cache.stats(),
+        "search_results": search_results_cache.stats()
+    }
@@ -0,0 +1,104 @@
+# utils/semantic_cache.py - answers to earlier questions, matched by meaning rather than exact text
+import threading
+from collections import OrderedDict
+import faiss
+import numpy as np
+from config.settings import SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+    faiss.normalize_L2(vector)
+    return vector
+
+
+class SemanticAnswerCache:
+    """
+    Process-wide cache of generated answers keyed by question embedding
+
+    Entries are partitioned by (index path, index version, scope key), so an answer
+    is only reused for questions over the same material and course. Each partition
+    has its own inner-product index over normalized question vectors, so similarity
+    is the cosine. At most max_entries answers are kept across all partitions
+    (least recently used evicted first), and partitions of an index version that
+    has been replaced are dropped.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.partitions = {}       # partition -> (faiss index, {entry id: (question, answer)})
+        self.lru = OrderedDict()   # (partition, entry id), least recently used first
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, partition, vector):
+        """
+        Answer to the most similar earlier question in a partition
+
+        Returns:
+            tuple: (answer, cached question, similarity), or None below the threshold
+        """
+        with self._lock:
+            entry = self.partitions.get(partition)
+            if entry is None or entry[0].ntotal == 0:
+                self.misses += 1
+                return None
+            index, answers = entry
+            similarities, ids = index.search(_unit(vector), 1)
+            similarity, entry_id = float(similarities[0][0]), int(ids[0][0])
+            if entry_id == -1 or similarity < self.threshold:
+                self.misses += 1
+                return None
+            self.lru.move_to_end((partition, entry_id))
+            self.hits += 1
+            question, answer = answers[entry_id]
+            return answer, question, similarity
+
+    def add(self, partition, vector, question, answer):
+        with self._lock:
+            self._drop_replaced(partition)
+            if partition not in self.partitions:
+                index = faiss.IndexIDMap2(faiss.IndexFlatIP(len(vector)))
+                self.partitions[partition] = (index, {})
+            index, answers = self.partitions[partition]
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(_unit(vector), np.array([entry_id], dtype=np.int64))
+            answers[entry_id] = (question, answer)
+            self.lru[(partition, entry_id)] = True
+            while len(self.lru) > self.max_entries:
+                (old_partition, old_id), _ = self.lru.popitem(last=False)
+                self._remove(old_partition, old_id)
+
+    def _remove(self, partition, entry_id):
+        index, answers = self.partitions[partition]
+        index.remove_ids(np.array([entry_id], dtype=np.int64))
+        del answers[entry_id]
+        if not answers:
+            del self.partitions[partition]
+
+    def _drop_replaced(self, partition):
+        """Forget partitions of older versions of the same index (their answers may be outdated)"""
+        db_path, version = partition[0], partition[1]
+        stale = [p for p in self.partitions if p[0] == db_path and p[1] != version]
+        for old in stale:
+            del self.partitions[old]
+        if stale:
+            self.lru = OrderedDict((key, True) for key in self.lru if key[0] not in stale)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.lru),
+            "partitions": len(self.partitions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+# Shared by all sessions in the process
+semantic_answer_cache = SemanticAnswerCache()
@@ -1,35 +1,1253 @@
 # utils/vector_store.py
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings 
-from config.settings import GROQ_API_KEY, GROQ_MODEL, VECTOR_DB_PATH
+from langchain_core.documents import Document
+from config.settings import (
+    GROQ_API_KEY, GROQ_MODEL, VECTOR_DB_PATH, VECTOR_INDEX_TYPE, VECTOR_DTYPE,
+    DEDUP_ENABLED, RETRIEVAL_MODE, HYBRID_ALPHA, HYBRID_CANDIDATES, LEXICAL_FAST_PATH_MAX_TERMS,
+    NEIGHBOUR_WINDOW, NEIGHBOUR_CONTEXT_CHARS,
+    IVF_NLIST, IVF_NPROBE, IVF_MIN_TRAIN_FACTOR, SQ8_MIN_TRAIN_VECTORS,
+    HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, PQ_M, PQ_NBITS, INDEX_SNAPSHOTS_KEPT,
+    COMPACTION_TOMBSTONE_RATIO, OPEN_INDEXES_MAX
+)
+from utils.embeddings import SharedEmbeddings
+from utils.embedding_pipeline import embed_texts
+from utils.chunk_store import ChunkStore
+from utils.lexical_index import LexicalIndex, tokenize
+from utils.dedup import DedupIndex
+from utils.retrieval_cache import LRUCache, search_results_cache, normalize_query, invalidate_index
+from collections import Counter, OrderedDict
+from datetime import datetime
+from filelock import FileLock
+import hashlib
+import json
 import os
+import shutil
+import threading
+import time
+import uuid
+import faiss
+import numpy as np
 
 # Use free local embeddings (no API cost!)
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-def create_vector_store(documents):
-    """Create FAISS vector store from documents"""
-    vector_store = FAISS.from_documents(documents, embeddings)
-    os.makedirs(VECTOR_DB_PATH, exist_ok=True)
-    vector_store.save_local(VECTOR_DB_PATH)
-    print(f"✅ Vector store created and saved to {VECTOR_DB_PATH}")
+# The model itself is loaded on first use and shared by every session (utils/embeddings.py)
+embeddings = SharedEmbeddings()
+
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+POSITIONS_FILE = "index.ids.json"  # chunk id stored at each FAISS position
+TOMBSTONES_FILE = "tombstones.json"  # deleted chunk ids still present in the FAISS index
+VERSIONS_DIR = "versions"          # one complete snapshot of the index per manifest version
+CURRENT_FILE = "CURRENT"           # name of the published snapshot
+LOCK_FILE = ".lock"                # held by the process publishing a new snapshot
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+VECTOR_DTYPES = ("float32", "float16", "int8")
+# How each vector dtype is stored: raw floats or a scalar quantizer (ivf_pq has its own codes)
+_CODECS = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+INDEX_BATCH_SIZE = 2048  # chunks embedded and added per step, so streamed files stay bounded in memory
+TAG_FIELDS = ("owner", "course")  # manifest fields set from the tags of an upload
+SCOPE_KEYS = ("doc_ids", "course", "owner", "pages")
+SCOPES_CACHED = 64       # resolved scopes (chunk ids + IDSelector) kept per loaded store
+
+_index_locks = {}
+_index_locks_guard = threading.Lock()
+_shared_stores = OrderedDict()  # absolute index path -> loaded store, least recently used first
+_shared_stores_lock = threading.Lock()
+_load_locks = {}  # absolute index path -> lock held while it is being loaded into _shared_stores
+_compactions = set()
+_compactions_lock = threading.Lock()
+
+
+def index_lock(db_path=VECTOR_DB_PATH):
+    """Lock serializing writes to one index directory within this process"""
+    with _index_locks_guard:
+        return _index_locks.setdefault(os.path.abspath(db_path), threading.Lock())
+
+
+# ============================================================================
+# SNAPSHOTS
+# ============================================================================
+# db_path/versions/v000012/  index, chunks, lexical index, manifest of version 12
+# db_path/CURRENT            "v000012" - replaced atomically when a new version is published
+#
+# Writers build the next version in a staging copy of the current one (hard links,
+# so only changed files take space) and then switch CURRENT. Readers load whichever
+# version CURRENT named at load time and keep serving it until they reload.
+
+def _snapshot_dir(db_path):
+    """Directory holding the published snapshot (db_path itself for staging and pre-snapshot stores)"""
+    current = os.path.join(db_path, CURRENT_FILE)
+    if os.path.exists(current):
+        with open(current, 'r') as f:
+            return os.path.join(db_path, VERSIONS_DIR, f.read().strip())
+    return db_path
+
+
+def current_version(db_path=VECTOR_DB_PATH):
+    """Version of the published snapshot (None if nothing is indexed yet)"""
+    current = os.path.join(db_path, CURRENT_FILE)
+    if os.path.exists(current):
+        with open(current, 'r') as f:
+            return int(f.read().strip().lstrip("v"))
+    return load_manifest(db_path)["version"] if _index_exists(db_path) else None
+
+
+def _migrate_flat_layout(db_path):
+    """Move a store written directly into db_path into its first snapshot"""
+    if os.path.exists(os.path.join(db_path, CURRENT_FILE)) or not _index_exists(db_path):
+        return
+    name = f"v{load_manifest(db_path)['version']:06d}"
+    target = os.path.join(db_path, VERSIONS_DIR, name)
+    os.makedirs(target, exist_ok=True)
+    for entry in os.listdir(db_path):
+        if os.path.isfile(os.path.join(db_path, entry)) and entry != LOCK_FILE:
+            os.replace(os.path.join(db_path, entry), os.path.join(target, entry))
+    _point_current(db_path, name)
+    print(f"📦 Moved {db_path} into snapshot {name}")
+
+
+def _point_current(db_path, name):
+    path = os.path.join(db_path, CURRENT_FILE)
+    with open(path + ".tmp", 'w') as f:
+        f.write(name)
+    os.replace(path + ".tmp", path)
+
+
+def _stage_snapshot(db_path):
+    """Hard-linked copy of the published snapshot for a writer to modify"""
+    stage = os.path.join(db_path, VERSIONS_DIR, f"staging-{uuid.uuid4().hex[:8]}")
+    os.makedirs(stage)
+    current = _snapshot_dir(db_path)
+    if current != db_path:
+        # Every index file is replaced rather than rewritten, and chunks.jsonl is only
+        # appended to, so linked files never change under the published snapshot
+        for name in os.listdir(current):
+            try:
+                os.link(os.path.join(current, name), os.path.join(stage, name))
+            except OSError:
+                shutil.copy2(os.path.join(current, name), os.path.join(stage, name))
+    return stage
+
+
+def _collect_snapshots(db_path):
+    """Delete all but the newest INDEX_SNAPSHOTS_KEPT versions and abandoned staging copies"""
+    versions_dir = os.path.join(db_path, VERSIONS_DIR)
+    current = os.path.basename(_snapshot_dir(db_path))
+    names = sorted(name for name in os.listdir(versions_dir) if name.startswith("v"))
+    stale = [name for name in names[:-INDEX_SNAPSHOTS_KEPT] if name != current]
+    stale += [name for name in os.listdir(versions_dir) if name.startswith("staging-")
+              and time.time() - os.path.getmtime(os.path.join(versions_dir, name)) > 86400]
+    for name in stale:
+        # Open/mmapped files stay readable for readers still pinned to this version
+        shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+
+
+def _write_snapshot(db_path, write):
+    """
+    Run write(stage_dir) on a staging copy of the current snapshot and publish the result
+
+    Writers are serialized across threads and processes (e.g. the ingest CLI next
+    to the web app's workers), so each one stages from the latest version.
+
+    Returns:
+        Whatever write returned (a FAISS store or None), tagged with the new version
+    """
+    os.makedirs(db_path, exist_ok=True)
+    with index_lock(db_path), FileLock(os.path.join(db_path, LOCK_FILE)):
+        _migrate_flat_layout(db_path)
+        stage = _stage_snapshot(db_path)
+        try:
+            vector_store = write(stage)
+        except BaseException:
+            shutil.rmtree(stage, ignore_errors=True)
+            raise
+        version = load_manifest(stage)["version"]
+        if not _index_exists(stage) or version == current_version(db_path):
+            # Nothing changed
+            shutil.rmtree(stage, ignore_errors=True)
+            published = _snapshot_dir(db_path)
+        else:
+            name = f"v{version:06d}"
+            published = os.path.join(db_path, VERSIONS_DIR, name)
+            os.replace(stage, published)
+            _point_current(db_path, name)
+            _collect_snapshots(db_path)
+            print(f"📢 Published index snapshot {name}")
+            _schedule_compaction(db_path, published)
+        if vector_store is not None:
+            if isinstance(vector_store.docstore, ChunkStore):
+                vector_store.docstore.path = published
+            vector_store.files = load_manifest(published)["files"]
+            _set_index_version(vector_store, db_path, version)
+        return vector_store
+
+
+# ============================================================================
+# INDEX TYPES
+# ============================================================================
+def _index_factory_string(index_type, dtype=VECTOR_DTYPE):
+    codec = _CODECS[dtype]
+    if index_type == "ivf_flat":
+        return f"IVF{IVF_NLIST},{codec}"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}" if dtype == "float32" else f"HNSW{HNSW_M}_{codec}"
+    if index_type == "ivf_pq":
+        return f"IVF{IVF_NLIST},PQ{PQ_M}x{PQ_NBITS}"
+    return codec
+
+
+def min_vectors_for(index_type, dtype="float32"):
+    """Vectors needed before an index type / dtype can be trained (0 = no training)"""
+    needed = IVF_NLIST * IVF_MIN_TRAIN_FACTOR if index_type.startswith("ivf") else 0
+    if dtype == "int8" and index_type != "ivf_pq":
+        # The SQ8 ranges are fixed at training, so they need a representative sample
+        needed = max(needed, SQ8_MIN_TRAIN_VECTORS)
+    return needed
+
+
+def build_index(vectors, index_type=VECTOR_INDEX_TYPE, dtype=VECTOR_DTYPE):
+    """
+    Build a FAISS index of the requested type over vectors
+
+    Trained index types fall back to a flat index, and int8 to float16, until
+    there are enough vectors to train them. dtype float16/int8 stores
+    scalar-quantized vectors (2 / 1 bytes per dimension instead of 4).
+
+    Returns:
+        tuple: (faiss index, index type actually built, dtype actually built)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unknown vector dtype '{dtype}', expected one of {VECTOR_DTYPES}")
+    if len(vectors) < min_vectors_for(index_type):
+        print(f"ℹ️ {len(vectors)} vectors is not enough to train {index_type} "
+              f"(needs {min_vectors_for(index_type)}), using flat for now")
+        index_type = "flat"
+    if len(vectors) < min_vectors_for(index_type, dtype):
+        print(f"ℹ️ {len(vectors)} vectors is not enough to train {dtype} "
+              f"(needs {min_vectors_for(index_type, dtype)}), storing float16 for now")
+        dtype = "float16"
+    index = faiss.index_factory(vectors.shape[1], _index_factory_string(index_type, dtype), faiss.METRIC_L2)
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        print(f"🏋️ Training {index_type} ({dtype}) index on {len(vectors)} vectors...")
+        index.train(vectors)
+    index.add(vectors)
+    return index, index_type, dtype
+
+
+def _record_build(manifest, built):
+    """Note the index type, dtype and training sample size of a newly built index in the manifest"""
+    index, manifest["index_type"], manifest["vector_dtype"] = built
+    manifest["trained_on"] = index.ntotal if min_vectors_for(*built[1:]) else 0
+
+
+def stores_exact_vectors(index):
+    """True if the index keeps the original float32 vectors (flat, or HNSW over flat storage)"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    return isinstance(index, faiss.IndexFlat)
+
+
+def decodes_vectors(index):
+    """
+    True if the index can give back its vectors (flat or float16 codes)
+
+    Holds for those codes stored directly, in IVF lists or as HNSW storage. PQ and
+    int8 codes only approximate the vectors, so those are re-embedded for rebuilds.
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexFlat, faiss.IndexIVFFlat)):
+        return True
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return index.sq.qtype == faiss.ScalarQuantizer.QT_fp16
+    return False
+
+
+def _stored_vectors(vector_store, positions, texts):
+    """Get vectors for rebuilding: decoded from the index when it allows, else re-embedded (cached)"""
+    index = vector_store.index
+    if not positions:
+        return np.zeros((0, index.d), dtype=np.float32)
+    if decodes_vectors(index):
+        vectors = index.reconstruct_n(0, index.ntotal)
+        return vectors if len(positions) == index.ntotal else vectors[positions]
+    return np.asarray(embed_texts(texts), dtype=np.float32)
+
+
+def _rebuild_store(vector_store, manifest, index_type, drop_ids=(), dtype=VECTOR_DTYPE):
+    """
+    Return a new FAISS store with the same chunks (minus drop_ids and tombstones) in an index_type index
+
+    Trained parts (IVF cells, int8 ranges) are retrained on all remaining vectors;
+    the manifest records what was built.
+    """
+    drop_ids = set(drop_ids) | getattr(vector_store, "tombstones", set())
+    kept = [(pos, doc_id) for pos, doc_id in sorted(vector_store.index_to_docstore_id.items())
+            if doc_id not in drop_ids]
+    docs = {doc_id: vector_store.docstore.search(doc_id) for _, doc_id in kept}
+    vectors = _stored_vectors(vector_store, [pos for pos, _ in kept],
+                              [docs[doc_id].page_content for _, doc_id in kept])
+    built = build_index(vectors, index_type, dtype)
+    _record_build(manifest, built)
+    index = built[0]
+    new_store = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(docs),
+        index_to_docstore_id={i: doc_id for i, (_, doc_id) in enumerate(kept)}
+    )
+    new_store.lexical_index = vector_store.lexical_index
+    new_store.lexical_index.remove(drop_ids)
+    new_store.dedup_index = getattr(vector_store, "dedup_index", None)
+    if new_store.dedup_index is not None:
+        new_store.dedup_index.remove(drop_ids)
+    new_store.tombstones = set()
+    return new_store
+
+
+def _removes_in_place(index):
+    """
+    True if index.remove_ids shifts the later vectors down (flat and scalar-quantized codes)
+
+    FAISS store positions must stay 0..n-1: IVF removes without renumbering the
+    remaining ids and HNSW cannot remove at all, so those indexes are rebuilt.
+    """
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlatCodes)
+
+
+def _remove_chunks(vector_store, manifest, ids):
+    """Delete chunks, rebuilding when the index type cannot remove vectors in place"""
+    vector_store.lexical_index.remove(ids)
+    if getattr(vector_store, "dedup_index", None) is not None:
+        vector_store.dedup_index.remove(ids)
+    if _removes_in_place(vector_store.index):
+        vector_store.delete(ids)
+        return vector_store
+    return _rebuild_store(vector_store, manifest, manifest.get("index_type", "flat"), drop_ids=ids,
+                          dtype=manifest.get("vector_dtype", "float32"))
+
+
+# ============================================================================
+# DELETION
+# ============================================================================
+# Deleting a document only records its chunk ids in tombstones.json (and drops them
+# from the lexical and dedup indexes); dense search skips them with an IDSelector.
+# The vectors stay in the FAISS index until compaction rebuilds it without them.
+
+def _load_tombstones(db_path):
+    path = os.path.join(db_path, TOMBSTONES_FILE)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return set(json.load(f))
+    return set()
+
+
+def _save_tombstones(tombstones, db_path):
+    path = os.path.join(db_path, TOMBSTONES_FILE)
+    if not tombstones:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path + ".tmp", 'w') as f:
+        json.dump(sorted(tombstones), f)
+    os.replace(path + ".tmp", path)
+
+
+def _tombstone_chunks(vector_store, ids):
+    """Hide chunks from search without touching the FAISS index"""
+    vector_store.tombstones.update(ids)
+    vector_store.lexical_index.remove(ids)
+    if getattr(vector_store, "dedup_index", None) is not None:
+        vector_store.dedup_index.remove(ids)
+
+
+def _index_restored(vector_store, manifest, db_path, restored):
+    """
+    Index near-duplicates that were dropped in favour of now deleted chunks (see DedupIndex.orphans)
+
+    Returns:
+        FAISS store (a new one if the index was migrated)
+    """
+    ids = [chunk_id for chunk_id, _ in restored]
+    vector_store = _index_batch(vector_store, manifest, db_path, ids, [doc for _, doc in restored], None)
+    dedup = vector_store.dedup_index
+    for chunk_id, doc in restored:
+        dedup.add(chunk_id, dedup.signature(doc.page_content))
+    per_document = Counter(chunk_id.rsplit(":", 1)[0] for chunk_id in ids)
+    for entry in manifest["files"].values():
+        if entry["doc_id"] in per_document:
+            entry["duplicates"] = entry.get("duplicates", 0) - per_document[entry["doc_id"]]
+    print(f"🧹 Indexed {len(ids)} chunks of other documents that duplicated the deleted ones")
+    return vector_store
+
+
+def _retire_chunks(vector_store, manifest, db_path, doc_id, ids):
+    """
+    Tombstone a document's chunks, indexing other documents' copies of them in their place
+
+    Returns:
+        FAISS store (a new one if the index was migrated)
+    """
+    _tombstone_chunks(vector_store, ids)
+    dedup = getattr(vector_store, "dedup_index", None)
+    if dedup is None:
+        return vector_store
+    dedup.forget_documents([doc_id])
+    restored = dedup.orphans(ids)
+    if restored:
+        vector_store = _index_restored(vector_store, manifest, db_path, restored)
+    return vector_store
+
+
+def _tombstone_ratio(snapshot):
+    """Share of the vectors in a snapshot's index that belong to deleted chunks"""
+    tombstones = _load_tombstones(snapshot)
+    if not tombstones:
+        return 0.0
+    with open(os.path.join(snapshot, POSITIONS_FILE), 'r') as f:
+        total = len(json.load(f))
+    return len(tombstones) / max(total, 1)
+
+
+def _schedule_compaction(db_path, snapshot):
+    """Compact in a background thread once tombstones reach COMPACTION_TOMBSTONE_RATIO of the index"""
+    if _tombstone_ratio(snapshot) < COMPACTION_TOMBSTONE_RATIO:
+        return
+    key = os.path.abspath(db_path)
+    with _compactions_lock:
+        if key in _compactions:
+            return
+        _compactions.add(key)
+
+    def compact():
+        try:
+            compact_vector_store(db_path)
+        except Exception as e:
+            print(f"❌ Compacting {db_path} failed: {e}")
+        finally:
+            with _compactions_lock:
+                _compactions.discard(key)
+
+    # Waits for the index lock, so it starts after the current write is published
+    threading.Thread(target=compact, name="index-compaction", daemon=True).start()
+
+
+def delete_document(doc_id, db_path=VECTOR_DB_PATH):
+    """
+    Remove a document (and every file alias of it) from the index by document id
+
+    Cheap: publishes a snapshot with the chunks tombstoned, without loading or
+    rewriting the FAISS index. Their memory is reclaimed by compaction. Only when
+    other documents' near-duplicates of the chunks were dropped at ingestion is the
+    index loaded, to add one copy of each in their place.
+
+    Returns:
+        int: Number of chunks deleted (0 if the document is not indexed)
+    """
+    deleted = []
+
+    def delete(stage):
+        manifest = load_manifest(stage)
+        keys = [key for key, entry in manifest["files"].items() if entry["doc_id"] == doc_id]
+        if not keys or not _index_exists(stage):
+            return None
+        with open(os.path.join(stage, POSITIONS_FILE), 'r') as f:
+            indexed = set(json.load(f))
+        # Near-duplicate chunks were never indexed, so not every chunk number exists
+        ids = [chunk_id for chunk_id in (f"{doc_id}:{i}" for i in range(manifest["files"][keys[0]]["chunks"]))
+               if chunk_id in indexed]
+        dedup = DedupIndex.load(stage)
+        restored = []
+        if dedup is not None:
+            dedup.forget_documents([doc_id])
+            restored = dedup.orphans(ids)
+        if restored:
+            vector_store = load_vector_store(stage, mmap=False)
+            vector_store.dedup_index = dedup
+            _tombstone_chunks(vector_store, ids)
+            vector_store = _index_restored(vector_store, manifest, stage, restored)
+            save_vector_store(vector_store, stage)
+        else:
+            _save_tombstones(_load_tombstones(stage) | set(ids), stage)
+            lexical = LexicalIndex.load(stage)
+            if lexical is not None:
+                lexical.remove(ids)
+                lexical.save(stage)
+            if dedup is not None:
+                dedup.remove(ids)
+                dedup.save(stage)
+        for key in keys:
+            del manifest["files"][key]
+        manifest["version"] += 1
+        save_manifest(manifest, stage)
+        deleted.extend(ids)
+        print(f"🗑️ Deleted {', '.join(keys)} ({len(ids)} chunks)")
+        return None
+
+    _write_snapshot(db_path, delete)
+    return len(deleted)
+
+
+def compact_vector_store(db_path=VECTOR_DB_PATH):
+    """Rebuild the index without the vectors of deleted chunks"""
+    def compact(stage):
+        manifest = load_manifest(stage)
+        vector_store = load_vector_store(stage, mmap=False)
+        dropped = len(vector_store.tombstones)
+        if not dropped:
+            print("ℹ️ No deleted chunks to compact")
+            return vector_store
+        # Trained parts are refitted to the remaining vectors
+        vector_store = _rebuild_store(vector_store, manifest, manifest.get("index_type", "flat"),
+                                      dtype=manifest.get("vector_dtype", "float32"))
+        save_vector_store(vector_store, stage)
+        manifest["version"] += 1
+        save_manifest(manifest, stage)
+        print(f"🗜️ Compacted index: dropped {dropped} deleted chunks, {vector_store.index.ntotal} remain")
+        return vector_store
+
+    return _write_snapshot(db_path, compact)
+
+
+def file_hash(file_path):
+    """Return the SHA-256 hex digest of a file's contents"""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _source_key(file_path):
+    """Normalize a file path so the same file always maps to one manifest entry"""
+    return os.path.normpath(file_path).replace(os.sep, '/')
+
+
+def _index_exists(db_path):
+    return os.path.exists(os.path.join(_snapshot_dir(db_path), INDEX_FILE))
+
+
+def load_manifest(db_path=VECTOR_DB_PATH):
+    """Load the manifest of indexed files (of the published snapshot), or an empty one"""
+    path = os.path.join(_snapshot_dir(db_path), MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {"version": 0, "files": {}}
+
+
+def save_manifest(manifest, db_path=VECTOR_DB_PATH):
+    """Atomically write the manifest next to the index"""
+    os.makedirs(db_path, exist_ok=True)
+    path = os.path.join(db_path, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def is_file_indexed(file_path, db_path=VECTOR_DB_PATH):
+    """True if this exact file content is already in the index"""
+    if not _index_exists(db_path):
+        return False
+    entry = load_manifest(db_path)["files"].get(_source_key(file_path))
+    return entry is not None and entry["hash"] == file_hash(file_path)
+
+
+def create_vector_store(documents, source_path=None, incremental=True, db_path=VECTOR_DB_PATH,
+                        progress_callback=None, tags=None):
+    """
+    Add documents to the FAISS vector store and save it
+
+    Args:
+        documents: Chunks to index
+        source_path: File the chunks came from (recorded in the manifest)
+        incremental: Append to the existing index instead of rebuilding it
+        db_path: Index directory
+        progress_callback: Embedding progress, called as (done, total, chunks_per_second)
+        tags: {"owner": ..., "course": ...} recorded on the file's manifest entry (used by scoped search)
+
+    Returns:
+        FAISS vector store (None if there is nothing to index)
+    """
+    return _write_snapshot(db_path, lambda stage: _add_to_vector_store(
+        [(source_path, documents)], incremental, stage, progress_callback, tags))
+
+
+def add_files_to_vector_store(files, db_path=VECTOR_DB_PATH, progress_callback=None, tags=None):
+    """
+    Index several files with a single load and save of the index
+
+    Args:
+        files: List of (source_path, documents)
+        db_path: Index directory
+        progress_callback: Embedding progress, called as (done, total, chunks_per_second)
+        tags: {"owner": ..., "course": ...} recorded on every file's manifest entry
+
+    Returns:
+        FAISS vector store (None if there is nothing to index)
+    """
+    return _write_snapshot(db_path, lambda stage: _add_to_vector_store(files, True, stage, progress_callback,
+                                                                       tags))
+
+
+def _tagged(entry, tags):
+    """Manifest entry with the non-empty tags (owner, course) applied"""
+    return dict(entry, **{key: value for key, value in tags.items() if key in TAG_FIELDS and value})
+
+
+def _alias_entry(entries, duplicate, tags):
+    """Entry for a file with the same content as entries[duplicate] (tags are not inherited)"""
+    entry = {key: value for key, value in entries[duplicate].items() if key not in TAG_FIELDS}
+    return _tagged(dict(entry, alias_of=duplicate), tags)
+
+
+def _release_entry(vector_store, manifest, db_path, entry_key):
+    """
+    Remove a changed file's manifest entry and the chunks only it referenced
+
+    Chunks that file aliases still point at are kept: the first alias becomes their
+    owner and the other aliases are pointed at it.
+
+    Returns:
+        tuple: (FAISS store, number of chunks tombstoned)
+    """
+    entry = manifest["files"].pop(entry_key)
+    files = manifest["files"]
+    sharing = [key for key, other in files.items() if other["doc_id"] == entry["doc_id"]]
+    if sharing:
+        owner = next((key for key in sharing if not files[key].get("alias_of")), None)
+        if owner is None:
+            owner = sharing[0]
+            files[owner] = {key: value for key, value in files[owner].items() if key != "alias_of"}
+        for key in sharing:
+            if files[key].get("alias_of") == entry_key:
+                files[key] = dict(files[key], alias_of=owner)
+        return vector_store, 0
+    existing = set(vector_store.index_to_docstore_id.values())
+    old_ids = [chunk_id for chunk_id in (f"{entry['doc_id']}:{i}" for i in range(entry["chunks"]))
+               if chunk_id in existing]
+    return _retire_chunks(vector_store, manifest, db_path, entry["doc_id"], old_ids), len(old_ids)
+
+
+def tag_file(file_path, tags, db_path=VECTOR_DB_PATH):
+    """Set the owner/course of an already indexed file (publishes a manifest-only snapshot)"""
+    def retag(stage):
+        manifest = load_manifest(stage)
+        key = _source_key(file_path)
+        entry = manifest["files"].get(key)
+        if entry is None or _tagged(entry, tags) == entry:
+            return None
+        manifest["files"][key] = _tagged(entry, tags)
+        manifest["version"] += 1
+        save_manifest(manifest, stage)
+        return None
+
+    _write_snapshot(db_path, retag)
+
+
+def _batched(documents, size):
+    batch = []
+    for doc in documents:
+        batch.append(doc)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _index_batch(vector_store, manifest, db_path, ids, documents, progress_callback):
+    """Embed one batch of chunks and add it to vector_store (creating the store on first use)"""
+    texts = [doc.page_content for doc in documents]
+    vectors = embed_texts(texts, progress_callback=progress_callback)
+    if vector_store is None:
+        built = build_index(vectors, VECTOR_INDEX_TYPE, VECTOR_DTYPE)
+        _record_build(manifest, built)
+        index = built[0]
+        for chunk_id, doc in zip(ids, documents):
+            doc.id = chunk_id
+        # Nothing on disk yet: write chunks straight to the chunk store
+        docstore = InMemoryDocstore() if _index_exists(db_path) else ChunkStore.write_new(db_path, {})
+        docstore.add(dict(zip(ids, documents)))
+        # Vectors are already in the index; register the chunks against their positions
+        vector_store = FAISS(embedding_function=embeddings, index=index, docstore=docstore,
+                             index_to_docstore_id=dict(enumerate(ids)))
+        vector_store.lexical_index = LexicalIndex()
+        vector_store.lexical_index.add(ids, texts)
+        vector_store.tombstones = set()
+    else:
+        vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=[doc.metadata for doc in documents],
+                                    ids=ids)
+        vector_store.lexical_index.add(ids, texts)
+        built = manifest.get("index_type", "flat"), manifest.get("vector_dtype", "float32")
+        needed = min_vectors_for(VECTOR_INDEX_TYPE, VECTOR_DTYPE)
+        # Switch to the configured index type / dtype once there are enough vectors to train it
+        # (and retrain an index trained on fewer, e.g. int8 ranges fitted to a first small upload)
+        if vector_store.index.ntotal >= needed and \
+                (built != (VECTOR_INDEX_TYPE, VECTOR_DTYPE) or manifest.get("trained_on", 0) < needed):
+            print(f"🔁 Migrating index from {built[0]} ({built[1]}) to {VECTOR_INDEX_TYPE} ({VECTOR_DTYPE})")
+            vector_store = _rebuild_store(vector_store, manifest, VECTOR_INDEX_TYPE, dtype=VECTOR_DTYPE)
+    if isinstance(vector_store.docstore, ChunkStore):
+        # Keep chunk text on disk rather than in memory while a large file streams in
+        vector_store.docstore.flush()
+    return vector_store
+
+
+def _add_to_vector_store(files, incremental, db_path, progress_callback, tags=None):
+    tags = tags or {}
+    manifest = load_manifest(db_path)
+    if not incremental:
+        # A fresh index, published as the next version after the current one
+        manifest = {"version": manifest["version"], "files": {}}
+    vector_store = None
+    if incremental and _index_exists(db_path):
+        vector_store = load_vector_store(db_path, mmap=False)
+
+    new_entries = {}
+    hashes_in_batch = {}
+    added = 0
+    aliased = released = False
+    dedup = None
+    if DEDUP_ENABLED:
+        dedup = getattr(vector_store, "dedup_index", None) or DedupIndex()
+    for source_path, documents in files:
+        entry_key = content_hash = None
+        if source_path:
+            entry_key = _source_key(source_path)
+            content_hash = file_hash(source_path)
+            entry = manifest["files"].get(entry_key)
+            if vector_store is not None and entry and entry["hash"] == content_hash:
+                print(f"⏭️ {source_path} unchanged, skipping")
+                if tags and _tagged(entry, tags) != entry:
+                    manifest["files"][entry_key] = _tagged(entry, tags)
+                    aliased = True
+                continue
+            if vector_store is not None and entry:
+                # File changed: its old chunks go before it is re-added or aliased
+                vector_store, removed = _release_entry(vector_store, manifest, db_path, entry_key)
+                released = True
+                if removed:
+                    print(f"♻️ Removed {removed} outdated chunks of {source_path}")
+            duplicate = next((k for k, e in manifest["files"].items()
+                              if e["hash"] == content_hash and k != entry_key), None)
+            if vector_store is not None and duplicate:
+                print(f"⏭️ {source_path} has the same content as {duplicate}, skipping")
+                manifest["files"][entry_key] = _alias_entry(manifest["files"], duplicate, tags)
+                aliased = True
+                continue
+            if content_hash in hashes_in_batch:
+                print(f"⏭️ {source_path} has the same content as {hashes_in_batch[content_hash]}, skipping")
+                new_entries[entry_key] = _alias_entry(new_entries, hashes_in_batch[content_hash], tags)
+                aliased = True
+                continue
+        else:
+            documents = list(documents)
+            content_hash = hashlib.sha256("\n".join(d.page_content for d in documents).encode()).hexdigest()
+
+        # Documents may be a generator; they are embedded and added INDEX_BATCH_SIZE at a time
+        doc_id = content_hash[:16]
+        if vector_store is not None:
+            # Re-uploaded after deletion: its tombstoned chunks hold the same ids, remove them for real
+            stale = [chunk_id for chunk_id in vector_store.tombstones if chunk_id.startswith(doc_id + ":")]
+            if stale:
+                vector_store = _remove_chunks(vector_store, manifest, stale)
+                vector_store.tombstones.difference_update(stale)
+        count = duplicates = 0
+        for batch in _batched(documents, INDEX_BATCH_SIZE):
+            ids = [f"{doc_id}:{i}" for i in range(count, count + len(batch))]
+            for chunk, doc in zip(range(count, count + len(batch)), batch):
+                doc.metadata["doc_id"] = doc_id
+                doc.metadata["chunk"] = chunk
+                if source_path:
+                    doc.metadata["source"] = entry_key
+            count += len(batch)
+            if dedup is not None:
+                # Near-duplicates are dropped before they cost an embedding; chunk numbers keep gaps
+                ids, batch, dropped = dedup.filter(ids, batch)
+                duplicates += dropped
+            if batch:
+                vector_store = _index_batch(vector_store, manifest, db_path, ids, batch, progress_callback)
+                vector_store.dedup_index = dedup
+        if not count:
+            print(f"⚠️ No chunks to index{f' in {source_path}' if source_path else ''}")
+            continue
+        if duplicates:
+            print(f"🧹 Dropped {duplicates} of {count} chunks{f' of {source_path}' if source_path else ''} "
+                  f"as near-duplicates of indexed text")
+        added += count
+        if entry_key:
+            hashes_in_batch[content_hash] = entry_key
+            new_entries[entry_key] = _tagged({
+                "doc_id": doc_id,
+                "hash": content_hash,
+                "chunks": count,
+                "duplicates": duplicates,
+                "indexed_at": datetime.now().isoformat()
+            }, tags)
+
+    if not added:
+        if vector_store is not None and (aliased or released):
+            # Only aliases (or new tags) were recorded, or changed files lost their old chunks
+            if released:
+                save_vector_store(vector_store, db_path)
+            manifest["files"].update(new_entries)
+            manifest["version"] += 1
+            save_manifest(manifest, db_path)
+        return vector_store
+
+    save_vector_store(vector_store, db_path)
+    manifest["files"].update(new_entries)
+    manifest["version"] += 1
+    save_manifest(manifest, db_path)
+    print(f"✅ Indexed {added} chunks, vector store saved")
     return vector_store
 
-def load_vector_store():
-    """Load existing FAISS vector store"""
-    if not os.path.exists(VECTOR_DB_PATH):
-        raise FileNotFoundError(f"Vector store not found at {VECTOR_DB_PATH}")
-    
-    vector_store = FAISS.load_local(
-        VECTOR_DB_PATH,
-        embeddings,
-        allow_dangerous_deserialization=True
+
+def _set_index_version(vector_store, db_path, version):
+    """Tag a store with the manifest version it reflects (keys the search cache)"""
+    vector_store.db_path = db_path
+    vector_store.index_version = version
+    invalidate_index(db_path)
+
+
+def save_vector_store(vector_store, db_path=VECTOR_DB_PATH):
+    """Write the FAISS index, its position -> chunk id map and the chunk store"""
+    os.makedirs(db_path, exist_ok=True)
+    docstore = vector_store.docstore
+    if isinstance(docstore, ChunkStore) and os.path.samefile(docstore.path, db_path):
+        docstore.save()
+    else:
+        # Rebuilt or legacy store: write every chunk to a fresh chunk file
+        documents = {chunk_id: docstore.search(chunk_id)
+                     for chunk_id in vector_store.index_to_docstore_id.values()}
+        vector_store.docstore = ChunkStore.write_new(db_path, documents)
+
+    index_path = os.path.join(db_path, INDEX_FILE)
+    faiss.write_index(vector_store.index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+    positions = [vector_store.index_to_docstore_id[i] for i in range(vector_store.index.ntotal)]
+    with open(os.path.join(db_path, POSITIONS_FILE + ".tmp"), 'w') as f:
+        json.dump(positions, f)
+    os.replace(os.path.join(db_path, POSITIONS_FILE + ".tmp"), os.path.join(db_path, POSITIONS_FILE))
+    vector_store.lexical_index.save(db_path)
+    if getattr(vector_store, "dedup_index", None) is not None:
+        vector_store.dedup_index.save(db_path)
+    _save_tombstones(getattr(vector_store, "tombstones", set()), db_path)
+
+
+def _migrate_pickle_store(db_path):
+    """Convert a store written by FAISS.save_local (index.pkl) to the chunk store format"""
+    print(f"🔄 Migrating {db_path} from pickle docstore to chunk store...")
+    vector_store = FAISS.load_local(db_path, embeddings, allow_dangerous_deserialization=True)
+    vector_store.lexical_index = LexicalIndex.build(vector_store.index_to_docstore_id.values(),
+                                                    vector_store.docstore)
+    save_vector_store(vector_store, db_path)
+    os.remove(os.path.join(db_path, "index.pkl"))
+
+
+def load_vector_store(db_path=VECTOR_DB_PATH, mmap=True):
+    """
+    Load existing FAISS vector store
+
+    The store is pinned to the snapshot published at load time; use
+    get_vector_store() to follow newly published versions.
+
+    Args:
+        db_path: Index directory
+        mmap: Memory-map the index read-only so worker processes share it through
+              the page cache. Use mmap=False to get a store that can be added to.
+    """
+    if not _index_exists(db_path):
+        raise FileNotFoundError(f"Vector store not found at {db_path}")
+    root, db_path = db_path, _snapshot_dir(db_path)
+    if os.path.exists(os.path.join(db_path, "index.pkl")):
+        _migrate_pickle_store(db_path)
+
+    flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(os.path.join(db_path, INDEX_FILE), flags)
+    with open(os.path.join(db_path, POSITIONS_FILE), 'r') as f:
+        positions = json.load(f)
+    vector_store = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=ChunkStore(db_path),
+        index_to_docstore_id=dict(enumerate(positions))
     )
-    print(f"✅ Vector store loaded from {VECTOR_DB_PATH}")
+    vector_store.lexical_index = LexicalIndex.load(db_path)
+    if vector_store.lexical_index is None:
+        print("🔤 Building lexical index for existing chunks...")
+        vector_store.lexical_index = LexicalIndex.build(positions, vector_store.docstore)
+        vector_store.lexical_index.save(db_path)
+    vector_store.tombstones = _load_tombstones(db_path)
+    vector_store.dedup_index = None
+    if DEDUP_ENABLED and not mmap:
+        # Only writers need the signatures
+        vector_store.dedup_index = DedupIndex.load(db_path)
+        if vector_store.dedup_index is None:
+            print("🧹 Computing near-duplicate signatures for existing chunks...")
+            vector_store.dedup_index = DedupIndex.build(positions, vector_store.docstore)
+    manifest = load_manifest(db_path)
+    vector_store.db_path = root
+    vector_store.index_version = manifest["version"]
+    vector_store.files = manifest["files"]
+    print(f"✅ Vector store loaded from {db_path}")
     return vector_store
 
-def search_vector_store(vector_store, query, k=3):
-    """Search vector store for relevant documents"""
-    results = vector_store.similarity_search(query, k=k)
+
+def get_vector_store(db_path=VECTOR_DB_PATH):
+    """
+    Read-only store for the published snapshot, shared by all sessions in the process
+
+    Returns the same object until a new snapshot is published, then loads that one
+    (sessions holding the previous object can keep using it). None if nothing is indexed.
+    At most OPEN_INDEXES_MAX indexes stay loaded; the least recently used one is
+    closed when another is opened.
+    """
+    version = current_version(db_path)
+    if version is None:
+        return None
+    key = os.path.abspath(db_path)
+    with _shared_stores_lock:
+        vector_store = _shared_stores.get(key)
+        if vector_store is not None and vector_store.index_version >= version:
+            _shared_stores.move_to_end(key)
+            return vector_store
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    # Loaded outside the shared lock, so opening a cold index doesn't stall lookups
+    # of other indexes; sessions waiting for the same one reuse what the first loads
+    with load_lock:
+        with _shared_stores_lock:
+            vector_store = _shared_stores.get(key)
+        if vector_store is None or vector_store.index_version < version:
+            vector_store = load_vector_store(db_path)
+
+    with _shared_stores_lock:
+        shared = _shared_stores.get(key)
+        if shared is None or shared.index_version < vector_store.index_version:
+            _shared_stores[key] = vector_store
+        else:
+            vector_store = shared
+        _shared_stores.move_to_end(key)
+        while len(_shared_stores) > OPEN_INDEXES_MAX:
+            idle, _ = _shared_stores.popitem(last=False)
+            print(f"💤 Closed idle index {idle}")
+        return vector_store
+
+
+def close_vector_store(db_path=VECTOR_DB_PATH):
+    """Drop the shared store for an index (it is loaded again on the next get_vector_store)"""
+    with _shared_stores_lock:
+        return _shared_stores.pop(os.path.abspath(db_path), None) is not None
+
+
+def open_vector_stores():
+    """Paths of the indexes currently loaded, most recently used last"""
+    with _shared_stores_lock:
+        return list(_shared_stores)
+
+def rebuild_vector_store(index_type=VECTOR_INDEX_TYPE, db_path=VECTOR_DB_PATH, dtype=VECTOR_DTYPE):
+    """Rebuild an existing index as another index type and/or vector dtype (e.g. flat -> hnsw)"""
+    def rebuild(stage):
+        manifest = load_manifest(stage)
+        vector_store = load_vector_store(stage, mmap=False)
+        vector_store = _rebuild_store(vector_store, manifest, index_type, dtype=dtype)
+        save_vector_store(vector_store, stage)
+        manifest["version"] += 1
+        save_manifest(manifest, stage)
+        print(f"✅ Rebuilt {vector_store.index.ntotal} vectors as {manifest['index_type']} ({manifest['vector_dtype']}) index")
+        return vector_store
+
+    return _write_snapshot(db_path, rebuild)
+
+
+def search_params(index, nprobe=None, ef_search=None, selector=None):
+    """Per-query FAISS search parameters for approximate index types and/or an IDSelector"""
+    if faiss.try_extract_index_ivf(index) is not None:
+        params = faiss.SearchParametersIVF(nprobe=nprobe or IVF_NPROBE)
+    elif hasattr(index, "hnsw"):
+        params = faiss.SearchParametersHNSW(efSearch=ef_search or HNSW_EF_SEARCH)
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def _live_selector(vector_store):
+    """IDSelector excluding the positions of tombstoned chunks (None if nothing is deleted)"""
+    tombstones = getattr(vector_store, "tombstones", None)
+    if not tombstones:
+        return None
+    key = (len(tombstones), vector_store.index.ntotal)
+    cached = getattr(vector_store, "_live_selector", None)
+    if cached is None or cached[0] != key:
+        positions = np.array([position for position, chunk_id in vector_store.index_to_docstore_id.items()
+                              if chunk_id in tombstones], dtype=np.int64)
+        deleted = faiss.IDSelectorBatch(positions)
+        # Keep the batch alive alongside the IDSelectorNot that points to it
+        cached = vector_store._live_selector = (key, deleted, faiss.IDSelectorNot(deleted))
+    return cached[2]
+
+
+# ============================================================================
+# SCOPED SEARCH
+# ============================================================================
+# A scope restricts a search to part of the index, e.g.
+#   {"course": "STAT101"}, {"doc_ids": [...], "pages": (10, 25)}, {"owner": "alice"}
+# Keys combine with AND. doc_ids/course/owner are resolved through the manifest,
+# pages against the page number of each PDF chunk. The matching positions become
+# an IDSelector, so FAISS only scores chunks inside the scope.
+
+def scope_key(scope):
+    """Hashable form of a scope (None for an unrestricted search)"""
+    if not scope:
+        return None
+    unknown = set(scope) - set(SCOPE_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown scope keys {sorted(unknown)}, expected {SCOPE_KEYS}")
+    key = []
+    for name in SCOPE_KEYS:
+        value = scope.get(name)
+        if value is not None:
+            key.append((name, tuple(sorted(value)) if name == "doc_ids" else
+                        tuple(value) if name == "pages" else value))
+    return tuple(key) or None
+
+
+def scope_doc_ids(files, scope):
+    """Document ids of the manifest files matching a scope's doc_ids, course and owner"""
+    matching = {entry["doc_id"] for entry in files.values()
+                if all(scope.get(name) is None or entry.get(name) == scope[name] for name in TAG_FIELDS)}
+    if scope.get("doc_ids") is not None:
+        matching &= set(scope["doc_ids"])
+    return matching
+
+
+def _chunks_by_doc(vector_store):
+    """{doc_id: [(position, chunk id)]} for the store's index, computed once per store"""
+    cached = getattr(vector_store, "_chunks_by_doc", None)
+    if cached is None or cached[0] != vector_store.index.ntotal:
+        by_doc = {}
+        for position, chunk_id in vector_store.index_to_docstore_id.items():
+            by_doc.setdefault(chunk_id.rpartition(":")[0], []).append((position, chunk_id))
+        cached = vector_store._chunks_by_doc = (vector_store.index.ntotal, by_doc)
+    return cached[1]
+
+
+def _resolve_scope(vector_store, scope):
+    """
+    Live chunk ids inside a scope and an IDSelector over their positions
+
+    Returns:
+        tuple: (set of chunk ids, faiss IDSelector), or (None, None) for no scope
+    """
+    key = scope_key(scope)
+    if key is None:
+        return None, None
+    cache = getattr(vector_store, "_scopes", None)
+    if cache is None:
+        cache = vector_store._scopes = LRUCache(SCOPES_CACHED)
+    tombstones = getattr(vector_store, "tombstones", set())
+    cache_key = (key, vector_store.index.ntotal, len(tombstones))
+    resolved = cache.get(cache_key)
+    if resolved is None:
+        files = getattr(vector_store, "files", None)
+        if files is None:
+            files = load_manifest(vector_store.db_path)["files"]
+        by_doc = _chunks_by_doc(vector_store)
+        filtered = any(scope.get(name) is not None for name in ("doc_ids",) + TAG_FIELDS)
+        doc_ids = scope_doc_ids(files, scope) if filtered else by_doc
+        selected = [item for doc_id in doc_ids for item in by_doc.get(doc_id, ()) if item[1] not in tombstones]
+        if scope.get("pages") is not None:
+            first, last = scope["pages"]
+            selected = [(position, chunk_id) for position, chunk_id in selected
+                        if first <= vector_store.docstore.search(chunk_id).metadata.get("page", -1) <= last]
+        resolved = ({chunk_id for _, chunk_id in selected},
+                    faiss.IDSelectorBatch(np.array([position for position, _ in selected], dtype=np.int64)))
+        cache.put(cache_key, resolved)
+    return resolved
+
+
+def _dense_search(vector_store, query_vector, k, nprobe=None, ef_search=None, selector=None):
+    """Return [(Document, L2 distance)] for the k nearest live chunks (among selector's, if given)"""
+    query = np.asarray([query_vector], dtype=np.float32)
+    if selector is None:
+        selector = _live_selector(vector_store)
+    params = search_params(vector_store.index, nprobe, ef_search, selector)
+    distances, positions = vector_store.index.search(query, k, params=params)
+    results = []
+    for distance, position in zip(distances[0], positions[0]):
+        if position == -1:
+            continue
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[int(position)])
+        results.append((doc, float(distance)))
     return results
+
+
+def _min_max(scores):
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    if high == low:
+        return {key: 1.0 for key in scores}
+    return {key: (value - low) / (high - low) for key, value in scores.items()}
+
+
+def _lexical_documents(vector_store, hits):
+    return [vector_store.docstore.search(chunk_id) for chunk_id, _ in hits]
+
+
+def _chunk_position(doc):
+    """(doc_id, chunk number) of a chunk, or None for chunks without ids"""
+    if "chunk" in doc.metadata and "doc_id" in doc.metadata:
+        return doc.metadata["doc_id"], doc.metadata["chunk"]
+    doc_id, _, number = (doc.id or "").rpartition(":")
+    return (doc_id, int(number)) if doc_id and number.isdigit() else None
+
+
+def _stitch(previous, doc):
+    """Text of doc that is not already at the end of previous (consecutive chunks overlap)"""
+    same_span = previous.metadata.get("page") == doc.metadata.get("page")
+    overlap = previous.metadata.get("end", 0) - doc.metadata.get("start", 0)
+    if same_span and "start" in doc.metadata and 0 < overlap <= len(doc.page_content):
+        return doc.page_content[overlap:]
+    return "\n" + doc.page_content
+
+
+def expand_neighbours(vector_store, documents, window=None, context_chars=None):
+    """
+    Extend each hit with the chunks around it in the same file
+
+    Neighbours are looked up directly by chunk id (doc_id:i±1), and only
+    context_chars of each neighbour are kept. Hits from the same run of chunks
+    are merged into one passage, so overlapping hits don't repeat text in the
+    prompt. Passages keep the rank and metadata of their best hit.
+    """
+    window = NEIGHBOUR_WINDOW if window is None else window
+    context_chars = NEIGHBOUR_CONTEXT_CHARS if context_chars is None else context_chars
+    passages = []  # [doc_id, first, last, hit numbers, best hit] or a Document without position
+    for doc in documents:
+        position = _chunk_position(doc)
+        if position is None:
+            passages.append(doc)
+            continue
+        doc_id, number = position
+        for passage in passages:
+            if isinstance(passage, list) and passage[0] == doc_id and \
+                    passage[1] - 1 <= number + window and number - window <= passage[2] + 1:
+                passage[1], passage[2] = min(passage[1], number - window), max(passage[2], number + window)
+                passage[3].add(number)
+                break
+        else:
+            passages.append([doc_id, number - window, number + window, {number}, doc])
+
+    results = []
+    for passage in passages:
+        if not isinstance(passage, list):
+            results.append(passage)
+            continue
+        doc_id, first, last, hits, best = passage
+        chunks = {number: best if number == best.metadata.get("chunk") else
+                  vector_store.docstore.search(f"{doc_id}:{number}") for number in range(max(first, 0), last + 1)}
+        chunks = {number: doc for number, doc in chunks.items() if isinstance(doc, Document)}
+        numbers = sorted(chunks)
+        text, previous = "", None
+        for number in numbers:
+            doc = chunks[number]
+            piece = doc.page_content if previous is None else _stitch(previous, doc)
+            if number < min(hits):
+                piece = piece[-context_chars:]
+            elif number > max(hits):
+                piece = piece[:context_chars]
+            text += piece
+            previous = doc
+        metadata = dict(best.metadata, chunks=[numbers[0], numbers[-1]])
+        results.append(Document(id=best.id, page_content=text, metadata=metadata))
+    return results
+
+
+def search_vector_store(vector_store, query, k=3, mode=None, alpha=None, nprobe=None, ef_search=None,
+                        neighbours=0, scope=None):
+    """
+    Search vector store for relevant documents
+
+    Results are cached per (index, index version, options, query), so repeated
+    questions skip both the query embedding and the index search.
+
+    Args:
+        mode: "dense", "lexical" or "hybrid" (default RETRIEVAL_MODE)
+        alpha: Weight of the dense score in hybrid mode (default HYBRID_ALPHA)
+        nprobe: IVF lists to visit (default IVF_NPROBE); higher = better recall, slower
+        ef_search: HNSW candidate list size (default HNSW_EF_SEARCH)
+        neighbours: Chunks on each side of a hit to add as context (see expand_neighbours)
+        scope: Only search matching chunks, e.g. {"course": "STAT101", "pages": (1, 40)};
+               keys are doc_ids, course, owner and pages (see SCOPED SEARCH)
+    """
+    mode = mode or RETRIEVAL_MODE
+    alpha = HYBRID_ALPHA if alpha is None else alpha
+    cache_key = (getattr(vector_store, "db_path", id(vector_store)), getattr(vector_store, "index_version", None),
+                 mode, alpha, k, nprobe, ef_search, neighbours, scope_key(scope), normalize_query(query))
+    results = search_results_cache.get(cache_key)
+    if results is None:
+        results = _search(vector_store, query, k, mode, alpha, nprobe, ef_search, scope)
+        if neighbours:
+            results = expand_neighbours(vector_store, results, neighbours)
+        search_results_cache.put(cache_key, results)
+    return list(results)
+
+
+def skips_query_embedding(query, mode=None):
+    """
+    True if a search for query in mode (default RETRIEVAL_MODE) is answered without a query embedding
+
+    Hybrid keyword queries are still embedded when BM25 finds fewer than k chunks.
+    """
+    mode = mode or RETRIEVAL_MODE
+    return mode == "lexical" or (mode == "hybrid" and 0 < len(tokenize(query)) <= LEXICAL_FAST_PATH_MAX_TERMS)
+
+
+def _search(vector_store, query, k, mode, alpha, nprobe, ef_search, scope=None):
+    allowed, selector = _resolve_scope(vector_store, scope)
+    if allowed is not None and not allowed:
+        return []
+    lexical = getattr(vector_store, "lexical_index", None)
+    if lexical is None:
+        mode = "dense"
+
+    if mode == "lexical":
+        return _lexical_documents(vector_store, lexical.search(query, k, allowed))
+    keyword_hits = []
+    if mode == "hybrid" and skips_query_embedding(query, mode):
+        # Short keyword queries (course codes, acronyms): skip the query embedding,
+        # unless too few chunks contain the terms to fill k - then they come first
+        keyword_hits = lexical.search(query, k, allowed)
+        if len(keyword_hits) >= k:
+            return _lexical_documents(vector_store, keyword_hits)
+
+    query_vector = vector_store.embedding_function.embed_query(query)
+    if mode == "dense":
+        return [doc for doc, _ in _dense_search(vector_store, query_vector, k, nprobe, ef_search, selector)]
+
+    candidates = k * HYBRID_CANDIDATES
+    dense_hits = _dense_search(vector_store, query_vector, candidates, nprobe, ef_search, selector)
+    dense_docs = {doc.id: doc for doc, _ in dense_hits}
+    dense_scores = _min_max({doc.id: -distance for doc, distance in dense_hits})
+    lexical_scores = _min_max(dict(lexical.search(query, candidates, allowed)))
+    fused = {chunk_id: alpha * dense_scores.get(chunk_id, 0.0) + (1 - alpha) * lexical_scores.get(chunk_id, 0.0)
+             for chunk_id in set(dense_scores) | set(lexical_scores)}
+    first = [chunk_id for chunk_id, _ in keyword_hits]
+    best = (first + [chunk_id for chunk_id in sorted(fused, key=fused.get, reverse=True) if chunk_id not in first])[:k]
+    return [dense_docs.get(chunk_id) or vector_store.docstore.search(chunk_id) for chunk_id in best]